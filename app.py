@@ -2,12 +2,37 @@ from flask import Flask
 from flask_cors import CORS
 from auth.auth import auth_bp
 from course.course import course_bp
+from course.cleanup import start_cleanup_worker
+from config import Config
+import models
+import fast_json
+import logging_config
+import metrics
+import query_counter
 
-app = Flask(__name__)
-CORS(app)
 
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(course_bp, url_prefix='/api')
+def create_app(config_object=Config):
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    logging_config.init_app(app)
+    metrics.init_app(app)
+    query_counter.init_app(app)
+    CORS(app)
+    models.init_app(app)
+    fast_json.init_app(app)
+
+    # Фоновый поток очистки файлов запускается с первым запросом, а не при импорте:
+    # импорт не ходит в БД, а в каждом процессе gunicorn поток стартует свой
+    @app.before_request
+    def ensure_background_workers():
+        start_cleanup_worker()
+
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(course_bp, url_prefix='/api')
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,30 @@
+# ASGI-режим: маршруты чтения (каталог, курс, видео, PDF, комментарии) обслуживаются
+# асинхронно через async-движок SQLAlchemy, остальное - тем же Flask-приложением в пуле потоков.
+#
+#   gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+#
+# Нужны starlette, a2wsgi, uvicorn и асинхронный драйвер (asyncpg; для SQLite - aiosqlite)
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app
+from config import Config
+from course.async_views import routes
+from models.async_engine import dispose_async_engine
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await dispose_async_engine()
+
+
+def create_asgi_app(wsgi_app=flask_app):
+    return Starlette(
+        routes=routes + [Mount('/', app=WSGIMiddleware(wsgi_app, workers=Config.ASGI_WSGI_THREADS))],
+        lifespan=lifespan
+    )
+
+
+app = create_asgi_app()
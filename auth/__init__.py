@@ -1 +1 @@
-from .auth import token_required, admin_required, login #noqa
\ No newline at end of file
+from .auth import token_required, admin_required, login, invalidate_principal, principal_cache #noqa
\ No newline at end of file
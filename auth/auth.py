@@ -1,94 +1,144 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from datetime import datetime, timedelta
 from functools import wraps
+from collections import namedtuple
 from models import User, session 
+from sqlalchemy import insert
+import json
+import logging
 import jwt
 from config import Config
 from flask_cors import CORS  # Import CORS
+from cache_utils import TTLCache
+from .passwords import generate_password, hash_passwords, verify_password, PasswordHashBusy
 
 # Create Blueprint for auth
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 # Enable CORS only for the login route
 CORS(auth_bp, resources={r"/login": {"origins": "http://localhost:3000"}})
 
+# Authenticated user as seen by the routes. Only the fields the routes need,
+# so it can be cached between requests without holding ORM objects
+Principal = namedtuple('Principal', ['id', 'role', 'first_name'])
+
+# invalidate_principal only reaches this process. Admin entries expire within
+# ADMIN_PRINCIPAL_CACHE_TTL, so a demoted or deleted admin loses rights on every worker quickly
+principal_cache = TTLCache(
+    maxsize=Config.PRINCIPAL_CACHE_SIZE,
+    ttl=Config.PRINCIPAL_CACHE_TTL,
+    ttl_for=lambda principal: Config.ADMIN_PRINCIPAL_CACHE_TTL if principal.role == 'admin'
+    else Config.PRINCIPAL_CACHE_TTL
+)
+
+
+def _load_principal(user_id):
+    row = session.query(User.id, User.role, User.first_name).filter_by(id=user_id).first()
+    return Principal(*row) if row else None
+
+
+def get_principal(user_id):
+    return principal_cache.get_or_load(user_id, _load_principal)
+
+
+def invalidate_principal(user_id):
+    principal_cache.invalidate(user_id)
+
+
+# Returns (principal, None) or (None, error response)
+def _authenticate():
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]  # Extract token after Bearer
+    else:
+        return None, (jsonify({"message": "Token is missing!"}), 403)
+
+    try:
+        data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
+        current_user = get_principal(data['user_id'])
+    except Exception as e:
+        return None, (jsonify({"message": f"Token is invalid! {str(e)}"}), 403)
+    if current_user is None:
+        return None, (jsonify({"message": "Token is invalid! User not found"}), 403)
+    return current_user, None
+
+
 # Token verification decorator
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]  # Extract token after Bearer
-        else:
-            return jsonify({"message": "Token is missing!"}), 403
-
-        try:
-            data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
-            current_user = session.query(User).filter_by(id=data['user_id']).first()
-        except Exception as e:
-            return jsonify({"message": f"Token is invalid! {str(e)}"}), 403
+        current_user, error = _authenticate()
+        if error:
+            return error
         return f(current_user, *args, **kwargs)
     return decorated
 
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
-    
-    # Debug: Print the incoming email and password
-    print(f"Received email: {data.get('email')}")
-    
-    # Retrieve the user by email
-    user = session.query(User).filter_by(email=data.get('email')).first()
+    data = request.get_json(silent=True) or {}
+    email = data.get('email')
+    password = data.get('password')
+    if not email or not password:
+        return jsonify({"message": "Email and password are required"}), 400
 
-    # Debug: Check if the user is found
-    if user:
-        print(f"User found: {user.email}")
-        print(f"User password: {user.password_hash}")
-    else:
-        print(f"No user found with email: {data.get('email')}")
-    
-    # Check if user exists and verify password using check_password method
-    if user:
-        print(f"Password matched for user: {user.email}")
-        # Generate JWT token
-        token = jwt.encode(
-            {
-                'user_id': user.id,
-                'login': user.email,
-                'exp': datetime.utcnow() + timedelta(hours=1)
-            },
-            Config.SECRET_KEY,
-            algorithm="HS256"
-        )
-        
-        return jsonify({
-            "token": token, 
-            "login": user.email,
-            "user_role": user.role
-        })
-    
-    print("Invalid credentials!")
-    return jsonify({"message": "Invalid credentials!"}), 401
+    user = session.query(User.id, User.email, User.role, User.password_hash).filter_by(email=email).first()
+    # Соединение не нужно на время проверки пароля
+    session.commit()
+
+    # Проверка пароля - в пуле процессов, веб-поток только ждет результат
+    try:
+        ok, new_hash = verify_password(user.password_hash if user else None, password)
+    except PasswordHashBusy as e:
+        response = jsonify({"message": str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except Exception as e:
+        return jsonify({"message": f"Error verifying password: {str(e)}"}), 500
+
+    if not ok:
+        logger.info("Failed login attempt", extra={"email": email})
+        return jsonify({"message": "Invalid credentials!"}), 401
+
+    if new_hash:
+        # Хэш посчитан со старыми параметрами - заменяем, если его не поменяли параллельно
+        try:
+            session.query(User).filter_by(id=user.id, password_hash=user.password_hash).update(
+                {'password_hash': new_hash}, synchronize_session=False
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            logger.exception("Error upgrading password hash for user %s", user.id)
+
+    # Generate JWT token
+    token = jwt.encode(
+        {
+            'user_id': user.id,
+            'login': user.email,
+            'exp': datetime.utcnow() + timedelta(hours=1)
+        },
+        Config.SECRET_KEY,
+        algorithm="HS256"
+    )
+
+    return jsonify({
+        "token": token,
+        "login": user.email,
+        "user_role": user.role
+    })
 
 
 # Admin verification decorator
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-        else:
-            return jsonify({"message": "Token is missing!"}), 403
-
-        try:
-            data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
-            current_user = session.query(User).filter_by(id=data['user_id']).first()
-            if current_user.role != 'admin':
-                return jsonify({"message": "Admin access required!"}), 403
-        except Exception as e:
-            return jsonify({"message": f"Token is invalid! {str(e)}"}), 403
+        current_user, error = _authenticate()
+        if error:
+            return error
+        if current_user.role != 'admin':
+            return jsonify({"message": "Admin access required!"}), 403
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -108,23 +158,21 @@ def register_account(current_user):
         return jsonify({"message": "User with this email already exists"}), 400
             
     # Генерируем случайный пароль
-    import secrets
-    import string
-    alphabet = string.ascii_letters + string.digits
-    password = ''.join(secrets.choice(alphabet) for i in range(12))
+    password = generate_password()
             
     # Создаем нового пользователя
     new_user = User(
         email=data['email'],
         first_name=data['first_name'],
         last_name=data['last_name'],
-        role='student'
+        role='student',
+        password_hash=hash_passwords([password])[0]
     )
-    new_user.set_password(password)
     
     try:
         session.add(new_user)
         session.commit()
+        invalidate_principal(new_user.id)
                 
         return jsonify({
             "message": "User created successfully",
@@ -138,6 +186,65 @@ def register_account(current_user):
         session.rollback()
         return jsonify({"message": f"Error creating user: {str(e)}"}), 500
 
+@auth_bp.route('/register_accounts', methods=['POST'])
+@admin_required
+def register_accounts(current_user):
+    data = request.get_json()
+    if not data or not isinstance(data.get('users'), list):
+        return jsonify({"message": "users list is required"}), 400
+
+    required_fields = ['email', 'first_name', 'last_name']
+    users = data['users']
+
+    # Результат отдается потоком NDJSON: одна строка на пользователя, по мере обработки батчей
+    def generate():
+        seen = set()
+        for start in range(0, len(users), Config.BULK_BATCH_SIZE):
+            batch = list(enumerate(users[start:start + Config.BULK_BATCH_SIZE], start))
+            results = {}
+            valid = []
+            for index, item in batch:
+                if not isinstance(item, dict) or any(not item.get(field) for field in required_fields):
+                    results[index] = {"row": index, "status": "error", "message": "Missing required fields"}
+                elif item['email'] in seen:
+                    results[index] = {"row": index, "email": item['email'], "status": "error", "message": "Duplicate email in request"}
+                else:
+                    seen.add(item['email'])
+                    valid.append((index, item))
+
+            # Существующие email - одним запросом на батч
+            emails = [item['email'] for _, item in valid]
+            existing = {email for (email,) in session.query(User.email).filter(User.email.in_(emails))} if emails else set()
+            for index, item in valid:
+                if item['email'] in existing:
+                    results[index] = {"row": index, "email": item['email'], "status": "error", "message": "User with this email already exists"}
+            valid = [(index, item) for index, item in valid if item['email'] not in existing]
+
+            if valid:
+                passwords = [generate_password() for _ in valid]
+                try:
+                    password_hashes = hash_passwords(passwords)
+                    session.execute(insert(User.__table__), [{
+                        'email': item['email'],
+                        'first_name': item['first_name'],
+                        'last_name': item['last_name'],
+                        'role': 'student',
+                        'password_hash': password_hash,
+                        'created_at': datetime.utcnow()
+                    } for (_, item), password_hash in zip(valid, password_hashes)])
+                    session.commit()
+                    for (index, item), password in zip(valid, passwords):
+                        results[index] = {"row": index, "email": item['email'], "status": "created", "password": password}
+                except Exception as e:
+                    session.rollback()
+                    for index, item in valid:
+                        results[index] = {"row": index, "email": item['email'], "status": "error", "message": f"Error creating user: {str(e)}"}
+
+            for index, _ in batch:
+                yield json.dumps(results[index]) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
     response = jsonify({"message": "Logout successful"})
@@ -0,0 +1,136 @@
+import multiprocessing
+import secrets
+import string
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from config import Config
+
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+
+_pool = None
+_pool_lock = threading.Lock()
+# Ограничивает число проверок паролей в очереди + в работе, чтобы всплеск
+# входов не копил запросы, которые все равно не дождутся ответа
+_verify_slots = threading.BoundedSemaphore(Config.LOGIN_QUEUE_SIZE)
+# Хэш для проверки при неизвестном email - чтобы время ответа не выдавало,
+# существует ли пользователь
+_dummy_hash = None
+
+
+class PasswordHashBusy(Exception):
+    pass
+
+
+def generate_password(length=12):
+    return ''.join(secrets.choice(PASSWORD_ALPHABET) for i in range(length))
+
+
+def _normalize_method(method):
+    # werkzeug дописывает число итераций к pbkdf2 без него - приводим к тому же виду,
+    # чтобы сравнивать с префиксом сохраненного хэша
+    if method.startswith('pbkdf2:') and method.count(':') == 1:
+        return f'{method}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+HASH_METHOD = _normalize_method(Config.PASSWORD_HASH_METHOD)
+
+
+def hash_password(password, method=HASH_METHOD):
+    return generate_password_hash(password, method=method, salt_length=Config.PASSWORD_SALT_LENGTH)
+
+
+def needs_rehash(password_hash, method=HASH_METHOD):
+    return password_hash.split('$', 1)[0] != method
+
+
+# Выполняется в процессе пула: проверяет пароль и, если хэш посчитан
+# со старыми параметрами, сразу считает новый. Возвращает (ok, new_hash или None)
+def _verify(password_hash, password, method):
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash, method):
+        return True, hash_password(password, method)
+    return True, None
+
+
+def get_hash_pool():
+    # PBKDF2 упирается в CPU и держит GIL - считаем в отдельных процессах.
+    # spawn: дочерние процессы не наследуют соединения с БД и потоки веб-воркера
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=Config.PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+# После fork (gunicorn) процессы пула принадлежат родителю, а блокировки
+# могли быть захвачены его потоками - в дочернем процессе начинаем заново
+def reset_after_fork():
+    global _pool, _pool_lock, _verify_slots
+    _pool = None
+    _pool_lock = threading.Lock()
+    _verify_slots = threading.BoundedSemaphore(Config.LOGIN_QUEUE_SIZE)
+
+
+# Считает фиктивный хэш и запускает процессы пула заранее, чтобы это не делал первый /login.
+# start_pool=False - только хэш (в мастере gunicorn, до fork)
+def warm_up(start_pool=True):
+    _get_dummy_hash()
+    if start_pool:
+        get_hash_pool().submit(needs_rehash, '', HASH_METHOD).result()
+
+
+def hash_passwords(passwords):
+    chunksize = max(1, len(passwords) // (Config.PASSWORD_HASH_WORKERS * 4))
+    try:
+        return list(get_hash_pool().map(hash_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        # Упавший процесс делает пул непригодным - следующий вызов создаст новый
+        _reset_pool()
+        raise
+
+
+def _get_dummy_hash():
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(generate_password())
+    return _dummy_hash
+
+
+# Проверяет пароль в пуле процессов. password_hash=None - пользователь не найден,
+# проверка все равно выполняется (против перебора email по времени ответа).
+# Возвращает (ok, new_hash или None); PasswordHashBusy - очередь проверок заполнена
+def verify_password(password_hash, password):
+    if not _verify_slots.acquire(blocking=False):
+        raise PasswordHashBusy('Too many login attempts in progress, try again later')
+    try:
+        future = get_hash_pool().submit(_verify, password_hash or _get_dummy_hash(), password, HASH_METHOD)
+    except Exception:
+        _verify_slots.release()
+        raise
+    # Слот освобождается, когда проверка действительно завершилась, а не когда
+    # запрос перестал ее ждать
+    future.add_done_callback(lambda f: _verify_slots.release())
+    try:
+        ok, new_hash = future.result(timeout=Config.LOGIN_VERIFY_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise PasswordHashBusy('Password verification timed out, try again later')
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    return ok and password_hash is not None, new_hash
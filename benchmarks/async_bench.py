@@ -0,0 +1,124 @@
+# Сравнение WSGI (app.py) и ASGI (asgi.py, uvicorn-воркеры) на маршрутах чтения при одинаковом
+# числе воркеров: задержки и пропускная способность по маршрутам. Оба режима запускаются
+# с gunicorn.conf.py; класс воркера WSGI - из него (GUNICORN_WORKER_CLASS=sync - классический sync).
+#
+#   DATABASE_URL=postgresql://localhost/bench python benchmarks/async_bench.py --workers 4 --threads 64
+#
+# Сервера запускаются как подпроцессы на соседних портах. Разница видна, когда запросы ждут сеть
+# (Postgres на другой машине); на локальной SQLite без задержек результаты близки.
+# Без DATABASE_URL используется временная SQLite база.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'async_bench.db')
+
+# Маршруты, которые есть в асинхронном варианте (course/async_views.py)
+READ_ROUTES = {
+    'GET /api/courses',
+    'GET /api/course/<id>',
+    'GET /api/course/<id>/bundle',
+    'GET /api/course/<id>/videos',
+    'GET /api/course/<id>/pdfs',
+    'GET /api/course/<id>/video/<id>/comments',
+}
+
+MODES = {
+    'wsgi': ['app:app'],
+    'asgi': ['-k', 'uvicorn.workers.UvicornWorker', 'asgi:app'],
+}
+
+
+def start_server(mode, port, workers):
+    command = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+               '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+               '--log-level', 'warning'] + MODES[mode]
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+
+def wait_ready(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = client.request('GET', '/api/courses')
+            if status == 403:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('Server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WSGI vs ASGI read path at equal worker counts')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=32, help='concurrent client connections')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per mode')
+    parser.add_argument('--scale', type=float, default=0.05, help='seed volume, fraction of benchmarks/seed.py')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    from benchmarks.seed import seed, volumes
+    from benchmarks.load_test import HttpClient, load_fixtures, run, summarize, git_commit
+    from models import get_engine
+
+    seed(seed_value=args.seed, **volumes(args.scale))
+    fixtures = load_fixtures(args.students)
+    get_engine().dispose()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'dialect': get_engine().dialect.name,
+            'workers': args.workers,
+            'threads': args.threads,
+            'duration_s': args.duration,
+            'scale': args.scale,
+        },
+        'modes': {}
+    }
+    for offset, mode in enumerate(MODES):
+        port = args.port + offset
+        base_url = f'http://127.0.0.1:{port}'
+        server = start_server(mode, port, args.workers)
+        try:
+            wait_ready(HttpClient(base_url))
+            recorder, elapsed = run(lambda: HttpClient(base_url), fixtures, args.threads, args.duration,
+                                    args.seed, READ_ROUTES)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        routes = {route: summarize(values, recorder.errors.get(route, 0), elapsed)
+                  for route, values in sorted(recorder.latencies.items())}
+        everything = [value for values in recorder.latencies.values() for value in values]
+        routes['total'] = summarize(everything, sum(recorder.errors.values()), elapsed)
+        report['modes'][mode] = routes
+
+    print(f"{'route':<44} {'mode':<5} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route in report['modes']['wsgi']:
+        for mode, routes in report['modes'].items():
+            stats = routes.get(route)
+            if stats:
+                print(f"{route:<44} {mode:<5} {stats['requests']:>7} {stats['errors']:>5} "
+                      f"{stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+                      f"{stats['p99_ms']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# Проверка планов запросов горячих маршрутов: каждый SQL-запрос, выполненный маршрутом,
+# прогоняется через EXPLAIN, и проверка падает, если планировщик выбрал
+# последовательное сканирование большой таблицы.
+#
+#   DATABASE_URL=postgresql://localhost/bench python benchmarks/explain_check.py
+#
+# Без DATABASE_URL используется временная SQLite база. Данные создаются benchmarks/seed.py.
+# Код возврата 1, если найдено хотя бы одно последовательное сканирование.
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain_check.db')
+
+import jwt  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+
+# (название, роль, путь, таблицы, которые маршрут читает целиком намеренно)
+CHECKS = [
+    ('courses (admin)', 'admin', '/api/courses', {'courses'}),
+    ('courses (student)', 'student', '/api/courses', set()),
+    ('courses active_only (student)', 'student', '/api/courses?active_only=1', set()),
+    ('course detail', 'student', '/api/course/{course_id}', set()),
+    ('course videos', 'student', '/api/course/{course_id}/videos', set()),
+    ('course pdfs', 'student', '/api/course/{course_id}/pdfs', set()),
+    ('video detail', 'student', '/api/course/{course_id}/video/{video_id}', set()),
+    ('video comments', 'student', '/api/course/{course_id}/video/{video_id}/comments', set()),
+    # Первая страница без фильтров - чтение по первичному ключу с LIMIT
+    ('users', 'admin', '/api/users?include_total=0', {'users'}),
+    ('users by role', 'admin', '/api/users?role=student&include_total=0', set()),
+    ('users by email prefix', 'admin', '/api/users?email_prefix=seed-user-12&include_total=0', set()),
+    ('users by name prefix', 'admin', '/api/users?name_prefix=User12&include_total=0', set()),
+    ('user detail', 'admin', '/api/users/{student_id}', set()),
+]
+
+# Поиск по префиксу (LIKE ? || '%') в SQLite не использует индекс - это проверяется только на Postgres
+SQLITE_ALLOWED = {
+    'users by email prefix': {'users'},
+    'users by name prefix': {'users'},
+}
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+PG_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+class StatementRecorder:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.enabled = False
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def close(self):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled and not executemany:
+            self.statements.append((statement, parameters))
+
+
+def seq_scans(conn, statement, parameters, large_tables):
+    if conn.dialect.name == 'postgresql':
+        plan = [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        tables = [match.group(1) for line in plan for match in PG_SEQ_SCAN.finditer(line)]
+    else:
+        plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        tables = []
+        for detail in plan:
+            # Индексом считается только SEARCH ... USING. SCAN ... USING INDEX - это полный обход
+            # индекса с чтением таблицы; допускается лишь SCAN ... USING COVERING INDEX с LIMIT
+            match = SQLITE_SCAN.match(detail)
+            if match and not ('USING COVERING INDEX' in match.group(2) and LIMIT.search(statement)):
+                tables.append(match.group(1))
+    return [table for table in tables if table in large_tables], plan
+
+
+# Сидирует базу и прогоняет CHECKS. Возвращает [(название, путь, [проблемы])]
+def run_checks(scale=0.05, min_rows=1000, verbose=False):
+    from benchmarks.seed import seed, volumes
+    from app import app
+    from config import Config
+    from models import get_engine, session, Base, User, CourseAccess, Video
+
+    seed(**volumes(scale))
+    engine = get_engine()
+
+    with engine.connect() as conn:
+        counts = {table.name: conn.execute(select(func.count()).select_from(table)).scalar()
+                  for table in Base.metadata.sorted_tables}
+    large_tables = {name for name, count in counts.items() if count >= min_rows}
+
+    admin_id = session.query(User.id).filter_by(email='seed-admin@example.com').scalar()
+    student_id, course_id = session.query(CourseAccess.user_id, CourseAccess.course_id)\
+        .filter(CourseAccess.end_date > datetime.utcnow() + timedelta(days=1))\
+        .order_by(CourseAccess.id).first()
+    video_id = session.query(Video.id).filter_by(course_id=course_id).order_by(Video.order).limit(1).scalar()
+    session.remove()
+    ids = {'course_id': course_id, 'video_id': video_id, 'student_id': student_id}
+
+    def headers(user_id):
+        token = jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                           Config.SECRET_KEY, algorithm='HS256')
+        return {'Authorization': f'Bearer {token}'}
+    auth = {'admin': headers(admin_id), 'student': headers(student_id)}
+
+    recorder = StatementRecorder(engine)
+    client = app.test_client()
+    results = []
+    print(f"dialect: {engine.dialect.name}; large tables (>= {min_rows} rows): "
+              f"{', '.join(f'{name}={counts[name]}' for name in sorted(large_tables))}")
+
+    try:
+        for name, role, path, allowed in CHECKS:
+            path = path.format(**ids)
+            recorder.statements = []
+            recorder.enabled = True
+            response = client.get(path, headers=auth[role])
+            recorder.enabled = False
+
+            problems = []
+            if response.status_code != 200:
+                problems.append(f'HTTP {response.status_code}')
+            with engine.connect() as conn:
+                for statement, parameters in recorder.statements:
+                    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                        continue
+                    if conn.dialect.name == 'sqlite':
+                        allowed = allowed | SQLITE_ALLOWED.get(name, set())
+                    scanned, plan = seq_scans(conn, statement, parameters, large_tables - allowed)
+                    if verbose:
+                        print(f"  {' '.join(statement.split())}\n    " + '\n    '.join(plan))
+                    if scanned:
+                        problems.append(f"seq scan on {', '.join(scanned)}: {' '.join(statement.split())[:200]}")
+            results.append((name, path, len(recorder.statements), problems))
+    finally:
+        recorder.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail on sequential scans in hot route queries')
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='tables with fewer rows are not considered large')
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    parser.add_argument('--scale', type=float, default=0.05, help='seed volume, fraction of benchmarks/seed.py')
+    args = parser.parse_args()
+
+    results = run_checks(args.scale, args.min_rows, args.verbose)
+    failures = 0
+    for name, path, statements, problems in results:
+        status = 'FAIL' if problems else 'ok'
+        print(f"[{status}] {name} ({path}, {statements} statements)")
+        for problem in problems:
+            print(f"    {problem}")
+        failures += bool(problems)
+
+    print(f"{failures} of {len(CHECKS)} checks failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+# Нагрузочный тест приложения: сценарии студентов и администраторов на засеянной базе
+# (benchmarks/seed.py), задержки p50/p95/p99 и пропускная способность по маршрутам в JSON.
+#
+#   DATABASE_URL=postgresql://localhost/bench python benchmarks/load_test.py --threads 16 --duration 60 \
+#       --output results/$(git rev-parse --short HEAD).json --compare results/baseline.json
+#
+# По умолчанию запросы идут в приложение внутри процесса (Flask test client). С --url - по HTTP
+# в запущенный сервер; DATABASE_URL тогда должен указывать на его базу (из нее берутся id для сценариев).
+# Без DATABASE_URL используется временная SQLite база.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load_test.db')
+
+# Доля запросов от студентов, остальные - от администратора
+STUDENT_SHARE = 0.9
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers=None, body=None):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, headers=None, body=None):
+        data = None
+        headers = dict(headers or {})
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+# Данные для сценариев: студенты с действующим доступом, их курсы и видео
+def load_fixtures(students):
+    from sqlalchemy import select
+    from models import get_engine, User, CourseAccess, Video
+    from benchmarks.seed import ADMIN_EMAIL
+
+    now = datetime.utcnow()
+    with get_engine().connect() as conn:
+        admin_id = conn.execute(select(User.id).where(User.email == ADMIN_EMAIL)).scalar()
+        rows = conn.execute(
+            select(User.id, User.email, CourseAccess.course_id)
+            .join(CourseAccess, CourseAccess.user_id == User.id)
+            .where(User.email.like('seed-user-%'), CourseAccess.end_date >= now)
+            .order_by(User.id).limit(students * 5)
+        ).all()
+        users = {}
+        for user_id, email, course_id in rows:
+            users.setdefault((user_id, email), []).append(course_id)
+        users = list(users.items())[:students]
+        course_ids = sorted({course_id for _, courses in users for course_id in courses})
+        videos = {}
+        for video_id, course_id in conn.execute(
+                select(Video.id, Video.course_id).where(Video.course_id.in_(course_ids))):
+            videos.setdefault(course_id, []).append(video_id)
+        all_user_ids = [user_id for (user_id,) in conn.execute(
+            select(User.id).where(User.email.like('seed-user-%')).order_by(User.id))]
+    return {
+        'admin_id': admin_id,
+        'students': [{'id': user_id, 'email': email, 'courses': courses} for (user_id, email), courses in users],
+        'videos': videos,
+        'course_ids': course_ids,
+        'user_ids': all_user_ids,
+    }
+
+
+def make_token(user_id):
+    import jwt
+    from datetime import timedelta
+    from config import Config
+    return jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=2)},
+                      Config.SECRET_KEY, algorithm='HS256')
+
+
+# Сценарии: (маршрут для отчета, вес, функция). Вес - относительная частота внутри роли
+def student_scenarios(fixtures):
+    from benchmarks.seed import SEED_PASSWORD
+
+    def pick(rnd):
+        student = rnd.choice(fixtures['students'])
+        course_id = rnd.choice(student['courses'])
+        return student, course_id, rnd.choice(fixtures['videos'][course_id])
+
+    def login(client, rnd, headers):
+        student = rnd.choice(fixtures['students'])
+        return client.request('POST', '/auth/login', body={'email': student['email'], 'password': SEED_PASSWORD})
+
+    def catalog(client, rnd, headers):
+        return client.request('GET', '/api/courses', headers(pick(rnd)[0]))
+
+    def course_page(client, rnd, headers):
+        student, course_id, _ = pick(rnd)
+        return client.request('GET', f'/api/course/{course_id}/bundle', headers(student))
+
+    def course_detail(client, rnd, headers):
+        student, course_id, _ = pick(rnd)
+        return client.request('GET', f'/api/course/{course_id}', headers(student))
+
+    def course_videos(client, rnd, headers):
+        student, course_id, _ = pick(rnd)
+        return client.request('GET', f'/api/course/{course_id}/videos', headers(student))
+
+    def course_pdfs(client, rnd, headers):
+        student, course_id, _ = pick(rnd)
+        return client.request('GET', f'/api/course/{course_id}/pdfs', headers(student))
+
+    def video_detail(client, rnd, headers):
+        student, course_id, video_id = pick(rnd)
+        return client.request('GET', f'/api/course/{course_id}/video/{video_id}', headers(student))
+
+    def comments(client, rnd, headers):
+        student, course_id, video_id = pick(rnd)
+        return client.request('GET', f'/api/course/{course_id}/video/{video_id}/comments', headers(student))
+
+    def post_comment(client, rnd, headers):
+        student, course_id, video_id = pick(rnd)
+        return client.request('POST', f'/api/course/{course_id}/video/{video_id}/comment', headers(student),
+                              {'text': f'Load test comment {rnd.randint(0, 10 ** 9)}'})
+
+    return [
+        ('POST /auth/login', 5, login),
+        ('GET /api/courses', 25, catalog),
+        ('GET /api/course/<id>/bundle', 25, course_page),
+        ('GET /api/course/<id>', 10, course_detail),
+        ('GET /api/course/<id>/videos', 10, course_videos),
+        ('GET /api/course/<id>/pdfs', 10, course_pdfs),
+        ('GET /api/course/<id>/video/<id>', 15, video_detail),
+        ('GET /api/course/<id>/video/<id>/comments', 25, comments),
+        ('POST /api/course/<id>/video/<id>/comment', 5, post_comment),
+    ]
+
+
+def admin_scenarios(fixtures):
+    def users_list(client, rnd, headers):
+        return client.request('GET', '/api/users?role=student&include_total=0', headers(None))
+
+    def users_search(client, rnd, headers):
+        return client.request('GET', f'/api/users?email_prefix=seed-user-{rnd.randint(1, 999)}', headers(None))
+
+    def grant_access(client, rnd, headers):
+        return client.request('POST', '/api/course/grant-access', headers(None), {
+            'user_id': rnd.choice(fixtures['user_ids']),
+            'course_id': rnd.choice(fixtures['course_ids']),
+            'duration_days': rnd.randint(30, 365)
+        })
+
+    def stats(client, rnd, headers):
+        return client.request('GET', '/api/admin/stats', headers(None))
+
+    return [
+        ('GET /api/users', 40, users_list),
+        ('GET /api/users?email_prefix', 30, users_search),
+        ('POST /api/course/grant-access', 25, grant_access),
+        ('GET /api/admin/stats', 5, stats),
+    ]
+
+
+# routes - если задан, выполняются только сценарии с этими маршрутами
+def run(make_client, fixtures, threads, duration, seed_value, routes=None):
+    recorder = Recorder()
+    students = [item for item in student_scenarios(fixtures) if routes is None or item[0] in routes]
+    admins = [item for item in admin_scenarios(fixtures) if routes is None or item[0] in routes]
+    tokens = {student['id']: make_token(student['id']) for student in fixtures['students']}
+    tokens[None] = make_token(fixtures['admin_id'])
+
+    def headers(student):
+        return {'Authorization': f"Bearer {tokens[student['id'] if student else None]}"}
+
+    deadline = time.monotonic() + duration
+
+    def worker(n):
+        rnd = random.Random(seed_value * 1000 + n)
+        client = make_client()
+        while time.monotonic() < deadline:
+            scenarios = students if not admins or (students and rnd.random() < STUDENT_SHARE) else admins
+            route, _, scenario = rnd.choices(scenarios, weights=[weight for _, weight, _ in scenarios])[0]
+            started = time.perf_counter()
+            try:
+                status, _ = scenario(client, rnd, headers)
+                ok = status < 400
+            except Exception:
+                ok = False
+            recorder.record(route, time.perf_counter() - started, ok)
+
+    started = time.monotonic()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return recorder, time.monotonic() - started
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank: значение, не меньше которого fraction всех замеров
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 2),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(recorder, elapsed, args, dialect, volumes):
+    routes = {route: summarize(values, recorder.errors.get(route, 0), elapsed)
+              for route, values in sorted(recorder.latencies.items())}
+    everything = [value for values in recorder.latencies.values() for value in values]
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'dialect': dialect,
+            'target': args.url or 'in-process',
+            'python': sys.version.split()[0],
+            'threads': args.threads,
+            'duration_s': round(elapsed, 2),
+            'seed': args.seed,
+            'scale': args.scale,
+            'volumes': volumes,
+        },
+        'total': summarize(everything, sum(recorder.errors.values()), elapsed) if everything else None,
+        'routes': routes,
+    }
+
+
+def print_report(report):
+    print(f"{'route':<44} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    rows = list(report['routes'].items()) + [('total', report['total'])]
+    for route, stats in rows:
+        if stats:
+            print(f"{route:<44} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8.1f} "
+                  f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+
+# Сравнение с сохраненным отчетом; True, если p95 или пропускная способность
+# какого-либо маршрута хуже более чем на threshold процентов
+def compare(report, baseline, threshold):
+    print(f"\ncompared to {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta'].get('timestamp')})")
+    print(f"{'route':<44} {'p95 ms':>17} {'change':>8} {'rps':>17} {'change':>8}")
+    regressed = False
+    for route, stats in report['routes'].items():
+        old = baseline['routes'].get(route)
+        if not old:
+            continue
+        p95_change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        rps_change = (stats['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100 \
+            if old['throughput_rps'] else 0.0
+        flag = ''
+        if p95_change > threshold or rps_change < -threshold:
+            regressed = True
+            flag = '  <-- regression'
+        print(f"{route:<44} {old['p95_ms']:>8.1f}->{stats['p95_ms']:<8.1f} {p95_change:>+7.1f}% "
+              f"{old['throughput_rps']:>8.1f}->{stats['throughput_rps']:<8.1f} {rps_change:>+7.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test with student and admin scenarios')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--scale', type=float, default=1.0, help='seed volume, fraction of benchmarks/seed.py')
+    parser.add_argument('--students', type=int, default=200, help='distinct students driving the scenarios')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='base URL of a running server instead of the in-process app')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='JSON report of a previous run')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='percent; with --compare, exit 1 if any route is worse by more')
+    args = parser.parse_args()
+
+    from benchmarks.seed import seed, volumes
+    from models import get_engine
+
+    seed_volumes = volumes(args.scale)
+    seed(seed_value=args.seed, **seed_volumes)
+    fixtures = load_fixtures(args.students)
+    if not fixtures['students']:
+        sys.exit('No students with active course access in the database')
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        from app import app
+
+        def make_client():
+            return InProcessClient(app)
+
+    recorder, elapsed = run(make_client, fixtures, args.threads, args.duration, args.seed)
+    if not recorder.latencies:
+        sys.exit('No requests completed')
+    report = build_report(recorder, elapsed, args, get_engine().dialect.name, seed_volumes)
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Нагрузочный замер /auth/login: сколько входов в секунду выдерживает один процесс
+# и сколько это на одно ядро пула хэширования.
+#
+#   DATABASE_URL=postgresql://... python benchmarks/login_bench.py --threads 16 --duration 10
+#
+# Без DATABASE_URL используется временная SQLite база.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'login_bench.db')
+
+PASSWORD = 'bench-password'
+
+
+def seed_users(count):
+    from models import session, User, init_db
+    from auth.passwords import hash_passwords
+
+    init_db()
+
+    emails = [f'login-bench-{i}@example.com' for i in range(count)]
+    existing = {email for (email,) in session.query(User.email).filter(User.email.in_(emails))}
+    missing = [email for email in emails if email not in existing]
+    if missing:
+        for email, password_hash in zip(missing, hash_passwords([PASSWORD] * len(missing))):
+            session.add(User(email=email, first_name='Bench', last_name='User',
+                             role='student', password_hash=password_hash))
+        session.commit()
+    session.remove()
+    return emails
+
+
+def run(threads, duration, users):
+    from app import app
+    from config import Config
+
+    emails = seed_users(users)
+    client = app.test_client()
+    # Прогрев: поднимаем пул процессов до начала замера
+    client.post('/auth/login', json={'email': emails[0], 'password': PASSWORD})
+
+    counts = {'ok': 0, 'busy': 0, 'failed': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(n):
+        local = {'ok': 0, 'busy': 0, 'failed': 0}
+        i = n
+        while time.monotonic() < deadline:
+            response = app.test_client().post('/auth/login', json={
+                'email': emails[i % len(emails)], 'password': PASSWORD
+            })
+            if response.status_code == 200:
+                local['ok'] += 1
+            elif response.status_code == 503:
+                local['busy'] += 1
+            else:
+                local['failed'] += 1
+            i += threads
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    started = time.monotonic()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    rate = counts['ok'] / elapsed
+    print(f"hash method:      {Config.PASSWORD_HASH_METHOD}")
+    print(f"hash workers:     {Config.PASSWORD_HASH_WORKERS}")
+    print(f"client threads:   {threads}")
+    print(f"duration:         {elapsed:.1f}s")
+    print(f"logins ok:        {counts['ok']}")
+    print(f"rejected (503):   {counts['busy']}")
+    print(f"failed:           {counts['failed']}")
+    print(f"logins/sec:       {rate:.1f}")
+    print(f"logins/sec/core:  {rate / Config.PASSWORD_HASH_WORKERS:.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark /auth/login throughput')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+    run(args.threads, args.duration, args.users)
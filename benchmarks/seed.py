@@ -0,0 +1,147 @@
+# Заполняет базу синтетическими данными для бенчмарков и проверки планов запросов.
+# Полный объем: 100k пользователей, 1k курсов, 50k видео, 20k PDF, 500k доступов, 1M комментариев.
+#
+#   DATABASE_URL=postgresql://... python benchmarks/seed.py
+#   python benchmarks/seed.py --scale 0.05      # 5% объема для быстрых прогонов
+#
+# Данные детерминированы (--seed). Повторный запуск ничего не делает,
+# если данные уже есть (seed-admin@example.com).
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select, text  # noqa: E402
+
+SEED_PASSWORD = 'seed-password'
+ADMIN_EMAIL = 'seed-admin@example.com'
+BATCH_SIZE = 5000
+
+FULL_VOLUMES = {
+    'users': 100000,
+    'courses': 1000,
+    'videos_per_course': 50,
+    'pdfs_per_course': 20,
+    'access_per_user': 5,
+    'comments_per_video': 20,
+}
+
+
+# Объемы, уменьшенные в scale раз (количество "на курс/на пользователя" не меняется)
+def volumes(scale=1.0):
+    result = dict(FULL_VOLUMES)
+    result['users'] = max(10, int(FULL_VOLUMES['users'] * scale))
+    result['courses'] = max(5, int(FULL_VOLUMES['courses'] * scale))
+    return result
+
+
+def _insert(conn, table, rows):
+    # rows - итератор: в памяти не больше одного батча
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return total
+        conn.execute(insert(table), batch)
+        total += len(batch)
+
+
+def seed(users=FULL_VOLUMES['users'], courses=FULL_VOLUMES['courses'],
+         videos_per_course=FULL_VOLUMES['videos_per_course'], pdfs_per_course=FULL_VOLUMES['pdfs_per_course'],
+         access_per_user=FULL_VOLUMES['access_per_user'], comments_per_video=FULL_VOLUMES['comments_per_video'],
+         seed_value=42):
+    from models import get_engine, init_db, User, Course, Video, PdfDocument, CourseAccess, Comment
+    from auth.passwords import hash_password
+
+    engine = get_engine()
+    init_db(engine)
+    rnd = random.Random(seed_value)
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        if conn.execute(select(User.id).where(User.email == ADMIN_EMAIL)).first():
+            print("Database is already seeded")
+            return False
+
+        # Один хэш на всех: пароль одинаковый, а PBKDF2 на каждого пользователя - минуты
+        password_hash = hash_password(SEED_PASSWORD)
+        conn.execute(insert(User.__table__), [{
+            'email': ADMIN_EMAIL, 'first_name': 'Seed', 'last_name': 'Admin',
+            'role': 'admin', 'password_hash': password_hash, 'created_at': now
+        }])
+        _insert(conn, User.__table__, ({
+            'email': f'seed-user-{i}@example.com', 'first_name': f'User{i}', 'last_name': 'Seed',
+            'role': 'student', 'password_hash': password_hash,
+            'created_at': now - timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+        } for i in range(users)))
+        admin_id = conn.execute(select(User.id).where(User.email == ADMIN_EMAIL)).scalar()
+        student_ids = [row[0] for row in conn.execute(
+            select(User.id).where(User.email.like('seed-user-%')).order_by(User.id))]
+
+        _insert(conn, Course.__table__, ({
+            'title': f'Course {i}', 'description': f'Seeded course {i}',
+            'thumbnail_url': f'https://example.com/thumbs/{i}.png',
+            'created_by': admin_id, 'created_at': now, 'content_version': 1
+        } for i in range(courses)))
+        course_ids = [row[0] for row in conn.execute(
+            select(Course.id).where(Course.created_by == admin_id).order_by(Course.id))]
+
+        # Ранги с шагом как в course/ordering.py
+        from course.ordering import RANK_GAP
+        _insert(conn, Video.__table__, ({
+            'title': f'Video {n}', 'file_path': f'https://youtu.be/seed{course_id}x{n}',
+            'course_id': course_id, 'order': n * RANK_GAP, 'video_source': 'youtube', 'created_at': now
+        } for course_id in course_ids for n in range(1, videos_per_course + 1)))
+        _insert(conn, PdfDocument.__table__, ({
+            'title': f'PDF {n}', 'file_path': f'https://example.com/pdf/{course_id}/{n}.pdf',
+            'course_id': course_id, 'order': n * RANK_GAP, 'created_at': now
+        } for course_id in course_ids for n in range(1, pdfs_per_course + 1)))
+
+        # Примерно 80% доступов действующие, остальные истекли
+        access_count = _insert(conn, CourseAccess.__table__, ({
+            'user_id': user_id, 'course_id': course_id,
+            'start_date': now, 'end_date': now + timedelta(days=rnd.randint(-90, 365))
+        } for user_id in student_ids
+            for course_id in rnd.sample(course_ids, min(access_per_user, len(course_ids)))))
+
+        video_ids = [row[0] for row in conn.execute(
+            select(Video.id).where(Video.course_id.in_(course_ids)).order_by(Video.id))]
+        comment_count = _insert(conn, Comment.__table__, ({
+            'text': f'Comment {n}', 'user_id': rnd.choice(student_ids), 'video_id': video_id,
+            'created_at': now - timedelta(minutes=rnd.randint(0, 60 * 24 * 90))
+        } for video_id in video_ids for n in range(comments_per_video)))
+
+    # Статистика для планировщика после массовой вставки
+    with engine.begin() as conn:
+        conn.execute(text('ANALYZE'))
+    print(f"Seeded {len(student_ids) + 1} users, {len(course_ids)} courses, {len(video_ids)} videos, "
+          f"{len(course_ids) * pdfs_per_course} PDFs, {access_count} access rows, {comment_count} comments")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the database with synthetic data')
+    parser.add_argument('--scale', type=float, default=1.0, help='fraction of the full volumes')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--courses', type=int)
+    parser.add_argument('--videos-per-course', type=int)
+    parser.add_argument('--pdfs-per-course', type=int)
+    parser.add_argument('--access-per-user', type=int)
+    parser.add_argument('--comments-per-video', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    options = volumes(args.scale)
+    for key in options:
+        if getattr(args, key) is not None:
+            options[key] = getattr(args, key)
+    seed(seed_value=args.seed, **options)
+
+
+if __name__ == '__main__':
+    main()
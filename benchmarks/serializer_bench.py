@@ -0,0 +1,122 @@
+# Пропускная способность списковых маршрутов (строк в секунду) для каждого JSON-бэкенда,
+# плюс сравнение ORM-объекты + stdlib json против Core-кортежей + сериализатора.
+#
+#   DATABASE_URL=postgresql://localhost/bench python benchmarks/serializer_bench.py --iterations 50
+#
+# Без DATABASE_URL используется временная SQLite база. Данные создаются benchmarks/seed.py.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'serializer_bench.db')
+
+import jwt  # noqa: E402
+
+# (название, путь, ключ списка в ответе)
+ENDPOINTS = [
+    ('users', '/api/users?limit=500&include_total=0', 'users'),
+    ('courses', '/api/courses?limit=500', 'courses'),
+    ('course videos', '/api/course/{course_id}/videos', 'videos'),
+    ('course pdfs', '/api/course/{course_id}/pdfs', 'pdfs'),
+    ('video comments', '/api/course/{course_id}/video/{video_id}/comments?limit=500', 'comments'),
+    ('course bundle', '/api/course/{course_id}/bundle', None),
+]
+
+
+def rows_in(body, key):
+    if key is None:
+        return len(body['videos']) + len(body['pdfs']) + 1
+    return len(body[key])
+
+
+def bench_endpoints(client, headers, ids, iterations, backends):
+    import fast_json
+
+    print(f"{'endpoint':<16} {'backend':<8} {'rows':>6} {'req/s':>9} {'rows/s':>11}")
+    for name, path, key in ENDPOINTS:
+        path = path.format(**ids)
+        for backend in backends:
+            fast_json.BACKEND = backend
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, (path, response.status_code)
+            rows = rows_in(response.get_json(), key)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                client.get(path, headers=headers)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<16} {backend:<8} {rows:>6} {iterations / elapsed:>9.1f} {rows * iterations / elapsed:>11.0f}")
+
+
+def bench_serialization(course_id, video_id, iterations, backends):
+    # Только чтение и сериализация, без HTTP: ORM против Core на одних и тех же строках
+    import fast_json
+    from models import session, Comment, User
+    from course.queries import comments_query, serialize_comments
+
+    def orm_comments():
+        comments = session.query(Comment).filter(Comment.video_id == video_id)\
+            .order_by(Comment.created_at.desc(), Comment.id.desc()).limit(500).all()
+        users = {user.id: user for user in session.query(User).filter(User.id.in_({c.user_id for c in comments}))}
+        return json.dumps([{
+            'id': comment.id, 'text': comment.text, 'user_name': users[comment.user_id].first_name,
+            'created_at': comment.created_at.isoformat()
+        } for comment in comments]).encode('utf-8')
+
+    def core_comments(backend):
+        rows = session.execute(comments_query(video_id).limit(500)).all()
+        return fast_json.dumps(serialize_comments(rows), backend)
+
+    cases = [('orm + stdlib', orm_comments)] + [
+        (f'core + {backend}', lambda backend=backend: core_comments(backend)) for backend in backends
+    ]
+    count = len(session.execute(comments_query(video_id).limit(500)).all())
+    print(f"\n{f'comments ({count} rows)':<20} {'rows/s':>11}")
+    for name, run in cases:
+        run()
+        session.expunge_all()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            run()
+            session.expunge_all()
+        elapsed = time.perf_counter() - started
+        print(f"{name:<20} {count * iterations / elapsed:>11.0f}")
+    session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rows/sec of list endpoints per JSON backend')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--scale', type=float, default=0.05, help='seed volume, fraction of benchmarks/seed.py')
+    args = parser.parse_args()
+
+    from benchmarks.seed import seed, volumes
+    from app import app
+    from config import Config
+    from models import session, User, Video, Comment
+    import fast_json
+
+    seed(**volumes(args.scale))
+    admin_id = session.query(User.id).filter_by(email='seed-admin@example.com').scalar()
+    video_id, course_id = session.query(Comment.video_id, Video.course_id)\
+        .join(Video, Video.id == Comment.video_id).limit(1).first()
+    session.remove()
+    ids = {'course_id': course_id, 'video_id': video_id}
+
+    token = jwt.encode({'user_id': admin_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                       Config.SECRET_KEY, algorithm='HS256')
+    headers = {'Authorization': f'Bearer {token}'}
+    backends = ['stdlib'] + (['orjson'] if fast_json.orjson is not None else [])
+
+    bench_endpoints(app.test_client(), headers, ids, args.iterations, backends)
+    bench_serialization(course_id, video_id, args.iterations, backends)
+
+
+if __name__ == '__main__':
+    main()
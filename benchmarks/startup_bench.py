@@ -0,0 +1,69 @@
+# Замер холодного старта: импорт app и create_app() в отдельном процессе.
+# Импорт не должен создавать движок и ходить в БД - поэтому DATABASE_URL
+# указывает на несуществующий сервер, и любое подключение сломает замер.
+#
+#   python benchmarks/startup_bench.py --runs 10 --max-ms 1500
+#
+# Код возврата 1, если медиана превысила --max-ms или при импорте был создан движок.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+import models.models
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'engine_created': models.models._engine is not None,
+}))
+"""
+
+
+def measure():
+    env = dict(os.environ)
+    env['DATABASE_URL'] = 'postgresql://startup-bench@127.0.0.1:1/startup_bench'
+    started = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(started.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold import/startup time of the app')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None, help='fail if median startup exceeds this')
+    args = parser.parse_args()
+
+    results = [measure() for _ in range(args.runs)]
+    totals = sorted(r['import_ms'] + r['create_app_ms'] for r in results)
+    median = statistics.median(totals)
+    print(f"runs:             {args.runs}")
+    print(f"import median:    {statistics.median(r['import_ms'] for r in results):.1f} ms")
+    print(f"create_app median:{statistics.median(r['create_app_ms'] for r in results):.1f} ms")
+    print(f"total median:     {median:.1f} ms")
+    print(f"total max:        {totals[-1]:.1f} ms")
+
+    failed = False
+    if any(r['engine_created'] for r in results):
+        print("FAIL: database engine was created during import")
+        failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL: median startup {median:.1f} ms exceeds {args.max_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
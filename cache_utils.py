@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Потокобезопасный in-process кэш с ограничением по времени жизни (TTL)
+# и по размеру (вытесняется самая давно использованная запись).
+# ttl_for(value) - TTL конкретной записи, если он зависит от значения
+class TTLCache:
+    def __init__(self, maxsize=10000, ttl=60, ttl_for=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttl_for = ttl_for
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Увеличивается при каждой инвалидации, чтобы значение, загруженное
+        # параллельно с инвалидацией, не попало в кэш устаревшим
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            ttl = self.ttl_for(value) if self.ttl_for else self.ttl
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is None:
+            generation = self._generation
+            value = loader(key)
+            if value is not None:
+                self.set(key, value, generation)
+        return value
+
+    # То же для асинхронного loader (ASGI-маршруты, см. asgi.py)
+    async def get_or_load_async(self, key, loader):
+        value = self.get(key)
+        if value is None:
+            generation = self._generation
+            value = await loader(key)
+            if value is not None:
+                self.set(key, value, generation)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
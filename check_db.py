@@ -1,9 +1,9 @@
 from sqlalchemy import text
-from models import engine, session
+from models import get_engine
 
 def fix_video_sources():
     try:
-        with engine.connect() as conn:
+        with get_engine().connect() as conn:
             # Сначала сохраняем существующие данные
             conn.execute(text("""
                 ALTER TABLE videos 
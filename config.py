@@ -5,4 +5,92 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "secret_key")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Пул соединений (на один процесс gunicorn)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+    # Кэш аутентифицированных пользователей (token_required / admin_required).
+    # Инвалидация действует только в своем процессе: в остальных воркерах запись живет до TTL.
+    # Поэтому записи администраторов (понижение роли, удаление) живут секунды
+    PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+    ADMIN_PRINCIPAL_CACHE_TTL = int(os.getenv("ADMIN_PRINCIPAL_CACHE_TTL", "5"))
+    PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+    # Кэш доступов студентов к курсам (course_id -> end_date). По той же причине TTL короткий:
+    # отзыв доступа доходит до других воркеров за это время
+    ENTITLEMENT_CACHE_TTL = int(os.getenv("ENTITLEMENT_CACHE_TTL", "5"))
+    ENTITLEMENT_CACHE_SIZE = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "10000"))
+
+    # Постраничная выдача списков
+    COURSES_PAGE_SIZE = int(os.getenv("COURSES_PAGE_SIZE", "100"))
+    USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "100"))
+    COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "20"))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+    # Локальные файлы (uploads).
+    # FILE_SERVING_MODE: app - отдает сам Flask (Range, sendfile через wsgi.file_wrapper),
+    # x-accel - заголовок X-Accel-Redirect для nginx, x-sendfile - X-Sendfile для apache/lighttpd
+    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
+    FILE_SERVING_MODE = os.getenv("FILE_SERVING_MODE", "app")
+    X_ACCEL_REDIRECT_PREFIX = os.getenv("X_ACCEL_REDIRECT_PREFIX", "/protected-uploads")
+    FILE_CHUNK_SIZE = int(os.getenv("FILE_CHUNK_SIZE", str(256 * 1024)))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    # Фоновое удаление файлов: период опроса очереди (сек) и число попыток на файл
+    FILE_CLEANUP_INTERVAL = float(os.getenv("FILE_CLEANUP_INTERVAL", "30"))
+    FILE_CLEANUP_MAX_ATTEMPTS = int(os.getenv("FILE_CLEANUP_MAX_ATTEMPTS", "5"))
+
+    # ImageKit
+    IMAGEKIT_PUBLIC_KEY = os.getenv("IMAGEKIT_PUBLIC_KEY")
+    IMAGEKIT_PRIVATE_KEY = os.getenv("IMAGEKIT_PRIVATE_KEY")
+    IMAGEKIT_URL_ENDPOINT = os.getenv("IMAGEKIT_URL_ENDPOINT")
+    IMAGEKIT_UPLOAD_URL = os.getenv("IMAGEKIT_UPLOAD_URL", "https://upload.imagekit.io/api/v1/files/upload")
+    IMAGEKIT_UPLOAD_WORKERS = int(os.getenv("IMAGEKIT_UPLOAD_WORKERS", "4"))
+    IMAGEKIT_UPLOAD_QUEUE_SIZE = int(os.getenv("IMAGEKIT_UPLOAD_QUEUE_SIZE", "32"))
+    IMAGEKIT_MAX_RETRIES = int(os.getenv("IMAGEKIT_MAX_RETRIES", "3"))
+    IMAGEKIT_RETRY_BACKOFF = float(os.getenv("IMAGEKIT_RETRY_BACKOFF", "0.5"))
+    IMAGEKIT_TIMEOUT = float(os.getenv("IMAGEKIT_TIMEOUT", "60"))
+    # Сколько хранится статус фоновой загрузки; незавершенная за это время задача считается прерванной
+    IMAGEKIT_JOB_TTL = int(os.getenv("IMAGEKIT_JOB_TTL", "3600"))
+
+    # Массовые операции: строк на одну транзакцию
+    BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+
+    # Пул процессов для хэширования паролей (по умолчанию - по числу ядер)
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or os.cpu_count()
+    # Алгоритм и стоимость хэша в формате werkzeug (method:hash:iterations).
+    # При изменении хэши пользователей пересчитываются при следующем успешном входе
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:260000")
+    PASSWORD_SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+    # Проверки паролей при входе: сколько может ждать в очереди + выполняться,
+    # сверх этого /login отвечает 503; и сколько ждать результата проверки (сек)
+    LOGIN_QUEUE_SIZE = int(os.getenv("LOGIN_QUEUE_SIZE", "0")) or PASSWORD_HASH_WORKERS * 8
+    LOGIN_VERIFY_TIMEOUT = float(os.getenv("LOGIN_VERIFY_TIMEOUT", "10"))
+
+    # JSON-сериализация ответов: auto (orjson, если установлен), orjson или stdlib
+    JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+
+    # Логирование: уровень, формат (json или text), доля DEBUG-записей, которые пишутся (0..1),
+    # и размер очереди записей (при переполнении записи отбрасываются)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # /metrics: если задан токен, требуется заголовок Authorization: Bearer <token>
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Счетчик SQL-запросов на запрос (для разработки): заголовок X-Query-Count и предупреждения
+    # в лог, если запрос одной формы выполнен N_PLUS_ONE_THRESHOLD и более раз
+    QUERY_COUNTER = os.getenv("QUERY_COUNTER", "false").lower() in ("1", "true", "yes")
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+    # ASGI-режим (asgi.py): асинхронный драйвер БД. По умолчанию выводится из DATABASE_URL
+    # (postgresql -> postgresql+asyncpg, sqlite -> sqlite+aiosqlite)
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+    # Потоки для WSGI-маршрутов, смонтированных в ASGI-приложение (все, кроме асинхронных)
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "10"))
@@ -0,0 +1,44 @@
+from datetime import datetime
+from flask import jsonify
+from models import session
+from cache_utils import TTLCache
+from config import Config
+from .queries import entitlements_query
+
+# user_id -> {course_id: end_date}
+entitlement_cache = TTLCache(maxsize=Config.ENTITLEMENT_CACHE_SIZE, ttl=Config.ENTITLEMENT_CACHE_TTL)
+
+
+def _load_entitlements(user_id):
+    return dict(session.execute(entitlements_query(user_id)).all())
+
+
+def get_entitlements(user_id):
+    return entitlement_cache.get_or_load(user_id, _load_entitlements)
+
+
+def invalidate_entitlements(user_id=None):
+    # Без user_id сбрасываем кэш целиком (например, при удалении курса)
+    if user_id is None:
+        entitlement_cache.clear()
+    else:
+        entitlement_cache.invalidate(user_id)
+
+
+# Возвращает None, если доступ есть, иначе готовый ответ с ошибкой
+def check_course_access(current_user, course_id, denied_message='No access to this course'):
+    if current_user.role == 'admin':
+        return None
+
+    error = access_error(get_entitlements(current_user.id), course_id, denied_message)
+    return (jsonify({'error': error}), 403) if error else None
+
+
+# Текст ошибки доступа по словарю доступов пользователя или None (общая часть для WSGI и ASGI)
+def access_error(entitlements, course_id, denied_message='No access to this course'):
+    end_date = entitlements.get(course_id)
+    if end_date is None:
+        return denied_message
+    if end_date < datetime.utcnow():
+        return 'Access expired'
+    return None
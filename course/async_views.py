@@ -0,0 +1,293 @@
+import logging
+import time
+from datetime import datetime
+from functools import wraps
+import jwt
+from sqlalchemy import select, func
+from starlette.responses import Response
+from starlette.routing import Route
+from models import Course, CourseAccess, User, Video
+from models.async_engine import get_async_engine
+from auth import principal_cache
+from auth.auth import Principal
+from config import Config
+from fast_json import dumps
+from metrics import request_duration, requests_total, in_flight
+from pagination import parse_page_args, split_page, PaginationError
+from .access import entitlement_cache, access_error
+from .etag import make_etag
+from .queries import (
+    courses_query, serialize_courses, courses_fingerprint_query, entitlements_query,
+    course_videos_query, serialize_videos, course_pdfs_query, serialize_pdfs,
+    course_items_query, serialize_course_items, comments_query, serialize_comments
+)
+
+# Асинхронные версии маршрутов чтения из course.py для asgi.py: те же запросы (course/queries.py),
+# та же проверка токена и доступа, те же ответы и ETag. Кэши пользователей и доступов общие
+# с WSGI-маршрутами процесса, поэтому их инвалидация при изменениях действует и здесь
+
+logger = logging.getLogger(__name__)
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+
+
+def json_body(data, status=200):
+    return Response(dumps(data), status_code=status, media_type='application/json', headers=CORS_HEADERS)
+
+
+def error(message, status, key='error'):
+    return json_body({key: message}, status)
+
+
+def with_etag(response, etag):
+    response.headers['ETag'] = f'"{etag}"'
+    # Как set_etag в course/etag.py
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# 304, если If-None-Match содержит etag (слабые метки не совпадают, как в werkzeug)
+def not_modified(request, etag):
+    header = request.headers.get('if-none-match')
+    if not header:
+        return None
+    tags = {tag.strip() for tag in header.split(',')}
+    if '*' in tags or f'"{etag}"' in tags:
+        return with_etag(Response(status_code=304, headers=CORS_HEADERS), etag)
+    return None
+
+
+async def _load_principal(conn, user_id):
+    row = (await conn.execute(select(User.id, User.role, User.first_name).where(User.id == user_id))).first()
+    return Principal(*row) if row else None
+
+
+async def get_entitlements(conn, user_id):
+    async def load(key):
+        return dict((await conn.execute(entitlements_query(key))).all())
+    return await entitlement_cache.get_or_load_async(user_id, load)
+
+
+# Как _authenticate в auth/auth.py: (principal, None) или (None, ответ с ошибкой)
+async def authenticate(conn, request):
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None, error('Token is missing!', 403, 'message')
+    try:
+        data = jwt.decode(auth_header.split(' ')[1], Config.SECRET_KEY, algorithms=['HS256'])
+        current_user = await principal_cache.get_or_load_async(
+            data['user_id'], lambda user_id: _load_principal(conn, user_id))
+    except Exception as e:
+        return None, error(f'Token is invalid! {str(e)}', 403, 'message')
+    if current_user is None:
+        return None, error('Token is invalid! User not found', 403, 'message')
+    return current_user, None
+
+
+async def check_course_access(conn, current_user, course_id, denied_message='No access to this course'):
+    if current_user.role == 'admin':
+        return None
+    message = access_error(await get_entitlements(conn, current_user.id), course_id, denied_message)
+    return error(message, 403) if message else None
+
+
+# Соединение на запрос, аутентификация, метрики (метка эндпоинта - async.<имя>),
+# preflight CORS и ошибки в том же формате, что у WSGI-маршрутов
+def endpoint(handler):
+    name = f'async.{handler.__name__}'
+
+    @wraps(handler)
+    async def decorated(request):
+        if request.method == 'OPTIONS':
+            return Response(status_code=200, headers={
+                **CORS_HEADERS,
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': request.headers.get('access-control-request-headers', '*')
+            })
+        started = time.perf_counter()
+        in_flight.inc((name,))
+        status = 500
+        try:
+            async with get_async_engine().connect() as conn:
+                current_user, denied = await authenticate(conn, request)
+                response = denied or await handler(conn, current_user, request, **request.path_params)
+            status = response.status_code
+            return response
+        except PaginationError as e:
+            status = 400
+            return error(str(e), 400)
+        except Exception as e:
+            logger.exception('Unexpected error in %s', name)
+            return error(str(e), 500)
+        finally:
+            in_flight.inc((name,), -1)
+            request_duration.observe((name, request.method), time.perf_counter() - started)
+            requests_total.inc((name, request.method, str(status)))
+    return decorated
+
+
+async def courses_etag(conn, current_user, request, active_only):
+    # Тот же ETag, что у courses_etag в course.py: клиент может ходить в любой из режимов
+    query_string = request.url.query
+    if current_user.role == 'admin':
+        fingerprint = (await conn.execute(courses_fingerprint_query())).one()
+        return make_etag('courses', 'admin', query_string, *fingerprint)
+
+    entitlements = await get_entitlements(conn, current_user.id)
+    if not entitlements:
+        return make_etag('courses', current_user.id, query_string)
+    access = sorted((course_id, end_date.isoformat()) for course_id, end_date in entitlements.items())
+    if active_only:
+        now = datetime.utcnow()
+        access = [item for item in access if entitlements[item[0]] >= now]
+    fingerprint = (await conn.execute(courses_fingerprint_query(entitlements))).one()
+    return make_etag('courses', current_user.id, query_string, access, *fingerprint)
+
+
+@endpoint
+async def get_courses(conn, current_user, request):
+    after, limit = parse_page_args(request.query_params, Config.COURSES_PAGE_SIZE)
+    active_only = request.query_params.get('active_only', '').lower() in ('1', 'true', 'yes')
+
+    etag = await courses_etag(conn, current_user, request, active_only)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    is_admin = current_user.role == 'admin'
+    query = courses_query() if is_admin else courses_query(current_user.id, datetime.utcnow() if active_only else None)
+    if after is not None:
+        query = query.where(Course.id > after[0])
+    rows = (await conn.execute(query.order_by(Course.id).limit(limit + 1))).all()
+    rows, next_cursor = split_page(rows, limit, lambda row: (row[0],))
+    return with_etag(json_body({
+        'courses': serialize_courses(rows, with_access=not is_admin), 'next_cursor': next_cursor
+    }), etag)
+
+
+def _course_data(course):
+    return {
+        'id': course.id,
+        'title': course.title,
+        'description': course.description,
+        'thumbnail_url': course.thumbnail_url,
+        'created_by': course.created_by,
+        'created_at': course.created_at.isoformat() if course.created_at else None
+    }
+
+
+@endpoint
+async def get_course_detail(conn, current_user, request, course_id):
+    course = (await conn.execute(
+        select(Course.id, Course.title, Course.description, Course.thumbnail_url,
+               Course.created_by, Course.created_at, Course.content_version)
+        .where(Course.id == course_id)
+    )).first()
+    if not course:
+        return error('Course not found', 404)
+
+    denied = await check_course_access(conn, current_user, course_id)
+    if denied:
+        return denied
+
+    etag = make_etag('course', course_id, course.content_version)
+    return not_modified(request, etag) or with_etag(json_body({'course': _course_data(course)}), etag)
+
+
+@endpoint
+async def get_course_bundle(conn, current_user, request, course_id):
+    columns = [Course.id, Course.title, Course.description, Course.thumbnail_url,
+               Course.created_by, Course.created_at, Course.content_version]
+    if current_user.role != 'admin':
+        columns.append(
+            select(func.max(CourseAccess.end_date))
+            .where(CourseAccess.user_id == current_user.id, CourseAccess.course_id == Course.id)
+            .scalar_subquery().label('access_expires')
+        )
+    course = (await conn.execute(select(*columns).where(Course.id == course_id))).first()
+    if not course:
+        return error('Course not found', 404)
+
+    access_expires = None
+    if current_user.role != 'admin':
+        access_expires = course.access_expires
+        if access_expires is None:
+            return error('No access to this course', 403)
+        if access_expires < datetime.utcnow():
+            return error('Access expired', 403)
+
+    etag = make_etag('bundle', course_id, course.content_version, access_expires)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    videos_data, pdfs_data = serialize_course_items((await conn.execute(course_items_query(course_id))).all())
+    return with_etag(json_body({
+        'course': _course_data(course),
+        'videos': videos_data,
+        'pdfs': pdfs_data,
+        'access_expires': access_expires.strftime('%Y-%m-%d %H:%M:%S') if access_expires else None
+    }), etag)
+
+
+# Общая часть списков видео и PDF: курс, доступ, ETag по content_version
+async def _course_list(conn, current_user, request, course_id, kind, query, serialize):
+    version = (await conn.execute(select(Course.content_version).where(Course.id == course_id))).scalar()
+    if version is None:
+        return error('Course not found', 404)
+
+    denied = await check_course_access(conn, current_user, course_id)
+    if denied:
+        return denied
+
+    etag = make_etag(kind, course_id, version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    rows = (await conn.execute(query)).all()
+    return with_etag(json_body({kind: serialize(rows)}), etag)
+
+
+@endpoint
+async def get_course_videos(conn, current_user, request, course_id):
+    return await _course_list(conn, current_user, request, course_id, 'videos',
+                              course_videos_query(course_id), serialize_videos)
+
+
+@endpoint
+async def get_course_pdfs(conn, current_user, request, course_id):
+    return await _course_list(conn, current_user, request, course_id, 'pdfs',
+                              course_pdfs_query(course_id), serialize_pdfs)
+
+
+@endpoint
+async def get_video_comments(conn, current_user, request, course_id, video_id):
+    video_course_id = (await conn.execute(select(Video.course_id).where(Video.id == video_id))).scalar()
+    if video_course_id is None:
+        return error('Video not found', 404)
+
+    denied = await check_course_access(conn, current_user, video_course_id, 'No access to this video')
+    if denied:
+        return denied
+
+    after, limit = parse_page_args(request.query_params, Config.COMMENTS_PAGE_SIZE, cursor_size=2)
+    if after is not None:
+        try:
+            after = (datetime.fromisoformat(after[0]), int(after[1]))
+        except (TypeError, ValueError):
+            raise PaginationError('Invalid cursor')
+    rows = (await conn.execute(comments_query(video_id, after).limit(limit + 1))).all()
+    rows, next_cursor = split_page(rows, limit, lambda row: (row[2].isoformat(), row[0]))
+    return json_body({'comments': serialize_comments(rows), 'next_cursor': next_cursor})
+
+
+# Пути совпадают с course_bp (/api/...): эти маршруты перекрывают WSGI-версии
+routes = [
+    Route('/api/courses', get_courses, methods=['GET', 'OPTIONS']),
+    Route('/api/course/{course_id:int}', get_course_detail, methods=['GET', 'OPTIONS']),
+    Route('/api/course/{course_id:int}/bundle', get_course_bundle, methods=['GET', 'OPTIONS']),
+    Route('/api/course/{course_id:int}/videos', get_course_videos, methods=['GET', 'OPTIONS']),
+    Route('/api/course/{course_id:int}/pdfs', get_course_pdfs, methods=['GET', 'OPTIONS']),
+    Route('/api/course/{course_id:int}/video/{video_id:int}/comments', get_video_comments,
+          methods=['GET', 'OPTIONS']),
+]
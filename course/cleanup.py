@@ -0,0 +1,108 @@
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import select, update, delete, insert, union_all, literal, DateTime
+from models import session, get_engine, FileCleanupTask, Course, Video, PdfDocument
+from config import Config
+from .storage import delete_file, purge_files, purge_unreferenced, local_path_clause
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+_queue = FileCleanupTask.__table__
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# Ставит в очередь все локальные файлы курса одним INSERT ... SELECT: пути не читаются
+# в приложение, время запроса не зависит от числа видео и PDF. Выполнять до удаления строк курса.
+# Одна задача на каждую ссылку: delete_file уменьшает ref_count на 1
+def enqueue_course_files(course_id):
+    paths = union_all(*[
+        select(column.label('path')).where(where, local_path_clause(column))
+        for column, where in (
+            (Course.thumbnail_url, Course.id == course_id),
+            (Video.file_path, Video.course_id == course_id),
+            (Video.thumbnail_url, Video.course_id == course_id),
+            (PdfDocument.file_path, PdfDocument.course_id == course_id),
+        )
+    ]).subquery()
+    return session.execute(insert(_queue).from_select(
+        ['path', 'attempts', 'created_at'],
+        select(paths.c.path, literal(0), literal(datetime.utcnow(), DateTime))
+    )).rowcount
+
+
+# Будит фоновый поток после коммита
+def notify_cleanup_worker():
+    start_cleanup_worker()
+    _wakeup.set()
+
+
+def process_cleanup_queue():
+    # Уменьшение ref_count и удаление задачи из очереди - одна транзакция: после сбоя
+    # задача либо выполнена целиком, либо повторится без двойного уменьшения.
+    # SKIP LOCKED: несколько процессов gunicorn разбирают очередь, не мешая друг другу
+    released, current = [], None
+    try:
+        with get_engine().begin() as conn:
+            rows = conn.execute(
+                select(_queue.c.id, _queue.c.path)
+                .where(_queue.c.attempts < Config.FILE_CLEANUP_MAX_ATTEMPTS)
+                .order_by(_queue.c.id)
+                .limit(BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            ).all()
+
+            for current, file_path in rows:
+                released += delete_file(file_path, conn)
+            current = None
+            if rows:
+                conn.execute(delete(_queue).where(_queue.c.id.in_([task_id for task_id, _ in rows])))
+    except Exception:
+        # Пакет откатан целиком; попытка засчитывается задаче, на которой он упал
+        logger.exception("File cleanup failed for task %s", current)
+        if current is not None:
+            with get_engine().begin() as conn:
+                conn.execute(update(_queue).where(_queue.c.id == current).values(attempts=_queue.c.attempts + 1))
+        return 0
+
+    # Байты - только после коммита; ошибки здесь подберет purge_unreferenced
+    try:
+        purge_files(released)
+    except Exception:
+        logger.exception("Purging released files failed")
+    return len(rows)
+
+
+def _run():
+    while True:
+        _wakeup.clear()
+        try:
+            while process_cleanup_queue() == BATCH_SIZE:
+                pass
+            purge_unreferenced(BATCH_SIZE)
+        except Exception:
+            logger.exception("File cleanup worker error")
+        # Периодический опрос подбирает задачи, оставшиеся после рестарта или от других процессов
+        _wakeup.wait(Config.FILE_CLEANUP_INTERVAL)
+
+
+def start_cleanup_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='file-cleanup', daemon=True)
+            _worker.start()
+
+
+# После fork поток родителя в дочернем процессе не работает - он будет запущен заново
+def reset_after_fork():
+    global _worker, _worker_lock, _wakeup
+    _worker = None
+    _worker_lock = threading.Lock()
+    _wakeup = threading.Event()
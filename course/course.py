@@ -1,68 +1,86 @@
-from flask import Blueprint, request, jsonify, send_file, make_response
-from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, make_response
+import logging
+from datetime import datetime
 import os
-from werkzeug.utils import secure_filename
-from models import session, Course, CourseAccess, Video, User, Comment, PdfDocument
-from auth import token_required, admin_required
+from werkzeug.utils import safe_join
+from models import session, Course, CourseAccess, Video, User, Comment, PdfDocument, get_pool_stats
+from auth import token_required, admin_required, invalidate_principal, principal_cache
+from .access import check_course_access, invalidate_entitlements, entitlement_cache, get_entitlements
+from .etag import bump_course_version, get_course_version, make_etag, not_modified, set_etag
+from .files import send_local_file
+from .storage import save_file, delete_file, retain_file
+from .cleanup import enqueue_course_files, notify_cleanup_worker
+from .enrollment import apply_enrollment, iter_csv_rows
+from .ordering import lock_course, next_rank, get_position, move_item, apply_order
+from imagekit_utils import start_upload_job, get_upload_job, ImageKitUploadError
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func
+from sqlalchemy import func, select
 from flask_cors import CORS
 from sqlalchemy.sql import text
+from config import Config
+from pagination import get_page_args, split_page, PaginationError
+from fast_json import json_response
+from logging_config import get_logging_stats
+from .queries import (
+    users_query, count_query, serialize_users, courses_query, serialize_courses, courses_fingerprint_query,
+    course_videos_query, serialize_videos, course_pdfs_query, serialize_pdfs,
+    course_items_query, serialize_course_items, comments_query, serialize_comments
+)
 
 course_bp = Blueprint('course', __name__)
+logger = logging.getLogger(__name__)
 CORS(course_bp)
 
 # Конфигурация для загрузки файлов
-UPLOAD_FOLDER = 'uploads'
-COURSE_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'courses')
-VIDEO_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'videos')
-PDF_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'pdfs')
+UPLOAD_FOLDER = Config.UPLOAD_FOLDER
 
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi'}
 ALLOWED_PDF_EXTENSIONS = {'pdf'}
 
-# Создаем необходимые директории если их нет
-for folder in [UPLOAD_FOLDER, COURSE_UPLOAD_FOLDER, VIDEO_UPLOAD_FOLDER, PDF_UPLOAD_FOLDER]:
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def save_file(file, folder):
-    filename = secure_filename(file.filename)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-    unique_filename = timestamp + filename
-    file_path = os.path.join(folder, unique_filename)
-    file.save(file_path)
-    return file_path
-
-def delete_file(file_path):
-    if file_path and os.path.exists(file_path):
-        os.remove(file_path)
-
 @course_bp.route('/users', methods=['GET'])
 @admin_required
 def get_users(current_user):
     try:
-        # Get all users
-        users = session.query(User).all()
-        
-        users_list = []
-        for user in users:
-            users_list.append({
-                'id': user.id,
-                'email': user.email,
-                'first_name': user.first_name,
-                'role': user.role
-            })
-            
-        return jsonify({'users': users_list}), 200
+        after, limit = get_page_args(Config.USERS_PAGE_SIZE)
+        include_total = request.args.get('include_total', '1').lower() not in ('0', 'false', 'no')
+
+        # Фильтры выполняются в БД
+        role = request.args.get('role')
+        if role and role not in ('admin', 'student'):
+            return jsonify({'error': 'Invalid role'}), 400
+        query = users_query(role, request.args.get('email_prefix'), request.args.get('name_prefix'))
+
+        total = session.execute(count_query(query)).scalar() if include_total else None
+
+        if after is not None:
+            query = query.where(User.id > after[0])
+        rows = session.execute(query.order_by(User.id).limit(limit + 1)).all()
+        rows, next_cursor = split_page(rows, limit, lambda row: (row[0],))
+
+        result = {'users': serialize_users(rows), 'next_cursor': next_cursor}
+        if include_total:
+            result['total'] = total
+        return json_response(result), 200
         
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@course_bp.route('/admin/stats', methods=['GET'])
+@admin_required
+def runtime_stats(current_user):
+    return jsonify({
+        'pool': get_pool_stats(),
+        'principal_cache': principal_cache.stats(),
+        'entitlement_cache': entitlement_cache.stats(),
+        'logging': get_logging_stats()
+    }), 200
+
 @course_bp.route('/users/<int:user_id>', methods=['GET', 'PUT'])
 @admin_required
 def edit_user(current_user, user_id):
@@ -100,6 +118,7 @@ def edit_user(current_user, user_id):
                 user.role = data['role']
                 
             session.commit()
+            invalidate_principal(user_id)
             
             return jsonify({
                 'message': 'User updated successfully',
@@ -128,6 +147,7 @@ def delete_user(current_user, user_id):
             
         session.delete(user)
         session.commit()
+        invalidate_principal(user_id)
         
         return jsonify({'message': 'User deleted successfully'}), 200
         
@@ -140,35 +160,24 @@ def delete_user(current_user, user_id):
 def get_course_pdfs(current_user, course_id):
     try:
         # Проверяем существование курса
-        course = session.query(Course).filter_by(id=course_id).first()
-        if not course:
+        version = get_course_version(course_id)
+        if version is None:
             return jsonify({'error': 'Course not found'}), 404
 
         # Проверяем доступ к курсу для студентов
-        if current_user.role != 'admin':
-            access = session.query(CourseAccess).filter_by(
-                user_id=current_user.id,
-                course_id=course_id
-            ).first()
-            
-            if not access:
-                return jsonify({'error': 'No access to this course'}), 403
-                
-            if access.end_date < datetime.utcnow():
-                return jsonify({'error': 'Access expired'}), 403
+        denied = check_course_access(current_user, course_id)
+        if denied:
+            return denied
+
+        etag = make_etag('pdfs', course_id, version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
 
         # Получаем PDF документы курса, сортируем по order
-        pdfs = session.query(PdfDocument).filter_by(course_id=course_id).order_by(PdfDocument.order).all()
+        rows = session.execute(course_pdfs_query(course_id)).all()
         
-        pdfs_data = [{
-            'id': pdf.id,
-            'title': pdf.title,
-            'file_path': pdf.file_path,
-            'order': pdf.order,
-            'created_at': pdf.created_at.isoformat()
-        } for pdf in pdfs]
-        
-        return jsonify({'pdfs': pdfs_data}), 200
+        return set_etag(json_response({'pdfs': serialize_pdfs(rows)}), etag), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -177,11 +186,6 @@ def get_course_pdfs(current_user, course_id):
 @admin_required
 def add_pdf(current_user, course_id):
     try:
-        # Проверяем существование курса
-        course = session.query(Course).filter_by(id=course_id).first()
-        if not course:
-            return jsonify({'error': 'Course not found'}), 404
-
         # Получаем данные из запроса
         data = request.get_json()
         if not data:
@@ -193,20 +197,30 @@ def add_pdf(current_user, course_id):
         if not title or not pdf_url:
             return jsonify({'error': 'Title and PDF URL are required'}), 400
 
-        # Если order не указан, добавляем в конец
-        max_order = session.query(func.max(PdfDocument.order)).filter_by(course_id=course_id).scalar()
-        order = 1 if max_order is None else max_order + 1
+        # Проверяем существование курса и блокируем его до коммита
+        if not lock_course(course_id):
+            return jsonify({'error': 'Course not found'}), 404
+
+        # Локальный файл получает ссылку в той же транзакции
+        try:
+            retain_file(pdf_url, session)
+        except ValueError as e:
+            session.rollback()
+            return jsonify({'error': str(e)}), 400
 
-        # Создаем запись в базе данных
+        # Создаем запись в базе данных - в конец списка
         new_pdf = PdfDocument(
             title=title,
             file_path=pdf_url,
             course_id=course_id,
-            order=order,
+            order=next_rank(PdfDocument, course_id),
             created_at=datetime.utcnow()
         )
         
         session.add(new_pdf)
+        session.flush()
+        position = get_position(PdfDocument, new_pdf)
+        bump_course_version(course_id)
         session.commit()
         
         return jsonify({
@@ -215,7 +229,7 @@ def add_pdf(current_user, course_id):
                 'id': new_pdf.id,
                 'title': new_pdf.title,
                 'file_path': new_pdf.file_path,
-                'order': new_pdf.order,
+                'order': position,
                 'created_at': new_pdf.created_at.isoformat()
             }
         }), 201
@@ -230,6 +244,8 @@ def update_pdf(current_user, course_id, pdf_id):
     old_file_path = None
     new_file_path = None
     try:
+        if not lock_course(course_id):
+            return jsonify({'error': 'Course not found'}), 404
         pdf = session.query(PdfDocument).filter_by(id=pdf_id, course_id=course_id).first()
         if not pdf:
             return jsonify({'error': 'PDF not found'}), 404
@@ -238,33 +254,28 @@ def update_pdf(current_user, course_id, pdf_id):
         if 'title' in request.form:
             pdf.title = request.form['title']
 
-        # Обновляем order если предоставлен
+        # Обновляем order (позиция в списке, с 1) если предоставлен - меняется только ранг этого PDF
         if 'order' in request.form:
-            new_order = int(request.form['order'])
-            if new_order != pdf.order:
-                # Сдвигаем существующие PDF
-                if new_order > pdf.order:
-                    session.query(PdfDocument).filter(
-                        PdfDocument.course_id == course_id,
-                        PdfDocument.order > pdf.order,
-                        PdfDocument.order <= new_order
-                    ).update({PdfDocument.order: PdfDocument.order - 1})
-                else:
-                    session.query(PdfDocument).filter(
-                        PdfDocument.course_id == course_id,
-                        PdfDocument.order >= new_order,
-                        PdfDocument.order < pdf.order
-                    ).update({PdfDocument.order: PdfDocument.order + 1})
-                pdf.order = new_order
+            try:
+                new_position = int(request.form['order'])
+            except ValueError:
+                return jsonify({'error': 'order must be an integer'}), 400
+            if new_position < 1:
+                return jsonify({'error': 'order must be positive'}), 400
+            if new_position != get_position(PdfDocument, pdf):
+                move_item(PdfDocument, pdf, new_position)
 
         # Обновляем файл если предоставлен
         if 'pdf' in request.files:
             file = request.files['pdf']
             if file.filename != '' and allowed_file(file.filename, ALLOWED_PDF_EXTENSIONS):
                 old_file_path = pdf.file_path
-                new_file_path = save_file(file, PDF_UPLOAD_FOLDER)
+                new_file_path = save_file(file)
                 pdf.file_path = new_file_path
 
+        session.flush()
+        position = get_position(PdfDocument, pdf)
+        bump_course_version(course_id)
         session.commit()
         
         # Удаляем старый файл только после успешного коммита
@@ -277,16 +288,16 @@ def update_pdf(current_user, course_id, pdf_id):
                 'id': pdf.id,
                 'title': pdf.title,
                 'file_path': pdf.file_path,
-                'order': pdf.order,
+                'order': position,
                 'created_at': pdf.created_at.isoformat()
             }
         }), 200
         
     except Exception as e:
         session.rollback()
-        # В случае ошибки удаляем новый файл если он был создан
-        if new_file_path and os.path.exists(new_file_path):
-            os.remove(new_file_path)
+        # В случае ошибки освобождаем новый файл если он был создан
+        if new_file_path:
+            delete_file(new_file_path)
         return jsonify({'error': str(e)}), 500
 
 @course_bp.route('/course/<int:course_id>/pdf/<int:pdf_id>', methods=['DELETE'])
@@ -297,18 +308,12 @@ def delete_pdf(current_user, course_id, pdf_id):
         if not pdf:
             return jsonify({'error': 'PDF not found'}), 404
 
-        current_order = pdf.order
         file_path = pdf.file_path
 
-        # Удаляем запись из базы данных
+        # Удаляем запись из базы данных. Ранги остальных PDF не меняются
         session.delete(pdf)
         
-        # Обновляем order для оставшихся PDF
-        session.query(PdfDocument).filter(
-            PdfDocument.course_id == course_id,
-            PdfDocument.order > current_order
-        ).update({PdfDocument.order: PdfDocument.order - 1})
-        
+        bump_course_version(course_id)
         session.commit()
         
         # Удаляем файл после успешного коммита
@@ -320,6 +325,36 @@ def delete_pdf(current_user, course_id, pdf_id):
         session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def reorder_course_items(model, course_id):
+    # Полная перестановка списка (drag-and-drop) одним UPDATE ... CASE
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(item_id, int) for item_id in ids):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+
+        if not lock_course(course_id):
+            return jsonify({'error': 'Course not found'}), 404
+
+        existing = {item_id for (item_id,) in session.query(model.id).filter(model.course_id == course_id)}
+        if len(ids) != len(existing) or set(ids) != existing:
+            return jsonify({'error': 'ids must contain every item of the course exactly once'}), 400
+
+        apply_order(model, course_id, ids)
+        bump_course_version(course_id)
+        session.commit()
+
+        return jsonify({'message': 'Order updated successfully', 'ids': ids}), 200
+
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@course_bp.route('/course/<int:course_id>/pdfs/order', methods=['PUT'])
+@admin_required
+def reorder_pdfs(current_user, course_id):
+    return reorder_course_items(PdfDocument, course_id)
+
 @course_bp.route('/course/<int:course_id>/pdf/<int:pdf_id>', methods=['GET'])
 @token_required
 def get_pdf(current_user, course_id, pdf_id):
@@ -328,74 +363,82 @@ def get_pdf(current_user, course_id, pdf_id):
         if not pdf:
             return jsonify({'error': 'PDF not found'}), 404
         
-        print(f"PDF file path: {pdf.file_path}")
+        logger.debug("Sending PDF %s of course %s from %s", pdf_id, course_id, pdf.file_path)
 
         # Проверяем доступ к курсу для студентов
-        if current_user.role != 'admin':
-            access = session.query(CourseAccess).filter_by(
-                user_id=current_user.id,
-                course_id=course_id
-            ).first()
-            
-            if not access:
-                return jsonify({'error': 'No access to this PDF'}), 403
-                
-            if access.end_date < datetime.utcnow():
-                return jsonify({'error': 'Access expired'}), 403
+        denied = check_course_access(current_user, course_id, 'No access to this PDF')
+        if denied:
+            return denied
 
         # Проверяем существование файла
         if not os.path.exists(pdf.file_path):
             return jsonify({'error': 'PDF file not found on server'}), 404
 
         try:
-            return send_file(
+            return send_local_file(
                 pdf.file_path,
                 mimetype='application/pdf',
                 as_attachment=True,
                 download_name=f"{pdf.title}.pdf"
             )
-        except Exception as e:
-            print(f"Error sending file: {str(e)}")
+        except Exception:
+            logger.exception("Error sending PDF %s of course %s", pdf_id, course_id)
             return jsonify({'error': 'Error sending PDF file'}), 500
         
     except Exception as e:
-        print(f"Error in get_pdf: {str(e)}")
+        logger.exception("Error in get_pdf")
         return jsonify({'error': str(e)}), 500
 
+def courses_etag(current_user, active_only):
+    # Отпечаток списка без чтения самих курсов: id растут монотонно, поэтому
+    # (count, max(id), sum(content_version)) меняется при создании, удалении и изменении курса
+    if current_user.role == 'admin':
+        return make_etag('courses', 'admin', request.query_string.decode(),
+                         *session.execute(courses_fingerprint_query()).one())
+
+    entitlements = get_entitlements(current_user.id)
+    if not entitlements:
+        return make_etag('courses', current_user.id, request.query_string.decode())
+    access = sorted((course_id, end_date.isoformat()) for course_id, end_date in entitlements.items())
+    if active_only:
+        now = datetime.utcnow()
+        access = [item for item in access if entitlements[item[0]] >= now]
+    return make_etag('courses', current_user.id, request.query_string.decode(), access,
+                     *session.execute(courses_fingerprint_query(entitlements)).one())
+
 @course_bp.route('/courses', methods=['GET'])
 @token_required 
 def get_courses(current_user):
     try:
-        courses_data = []
-        
-        if current_user.role == 'admin':
+        after, limit = get_page_args(Config.COURSES_PAGE_SIZE)
+        active_only = request.args.get('active_only', '').lower() in ('1', 'true', 'yes')
+
+        etag = courses_etag(current_user, active_only)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        is_admin = current_user.role == 'admin'
+        if is_admin:
             # Для админа показываем все курсы
-            courses = session.query(Course).all()
-            for course in courses:
-                courses_data.append({
-                    'id': course.id,
-                    'title': course.title,
-                    'description': course.description,
-                    'thumbnail_url': course.thumbnail_url
-                })
+            query = courses_query()
         else:
-            # Для студента показываем только курсы с доступом
-            course_access = session.query(CourseAccess).filter_by(user_id=current_user.id).all()
-            for access in course_access:
-                course = session.query(Course).filter_by(id=access.course_id).first()
-                if course:
-                    courses_data.append({
-                        'id': course.id,
-                        'title': course.title,
-                        'description': course.description,
-                        'thumbnail_url': course.thumbnail_url,
-                        'access_expires': access.end_date.strftime('%Y-%m-%d %H:%M:%S')
-                    })
-        
-        response = jsonify({'courses': courses_data})
+            # Для студента показываем только курсы с доступом - одним запросом
+            query = courses_query(current_user.id, datetime.utcnow() if active_only else None)
+
+        if after is not None:
+            query = query.where(Course.id > after[0])
+        rows = session.execute(query.order_by(Course.id).limit(limit + 1)).all()
+        rows, next_cursor = split_page(rows, limit, lambda row: (row[0],))
+
+        courses_data = serialize_courses(rows, with_access=not is_admin)
+        
+        response = set_etag(json_response({'courses': courses_data, 'next_cursor': next_cursor}), etag)
         response.headers.add('Access-Control-Allow-Origin', '*')  # Разрешаем CORS
         return response, 200
         
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -428,6 +471,13 @@ def create_course(current_user):
         if not thumbnail_url:
             return jsonify({'error': 'Thumbnail URL is required'}), 400
 
+        # Локальная обложка получает ссылку в той же транзакции, что и курс
+        try:
+            retain_file(thumbnail_url, session)
+        except ValueError as e:
+            session.rollback()
+            return jsonify({'error': str(e)}), 400
+
         # Создаем новый курс
         try:
             new_course = Course(
@@ -458,29 +508,23 @@ def create_course(current_user):
 @token_required
 def get_course_detail(current_user, course_id):
     try:
-        print(f"Getting course details for course_id: {course_id}, user: {current_user.id}")  # Логирование
+        logger.debug("Getting course %s for user %s", course_id, current_user.id)
         
         # Получаем курс из базы данных
         course = session.query(Course).filter_by(id=course_id).first()
         
         if not course:
-            print(f"Course not found: {course_id}")  # Логирование
             return jsonify({'error': 'Course not found'}), 404
 
         # Проверяем доступ к курсу для студентов
-        if current_user.role != 'admin':
-            access = session.query(CourseAccess).filter_by(
-                user_id=current_user.id,
-                course_id=course_id
-            ).first()
-            
-            if not access:
-                print(f"No access for user {current_user.id} to course {course_id}")  # Логирование
-                return jsonify({'error': 'No access to this course'}), 403
-                
-            if access.end_date < datetime.utcnow():
-                print(f"Access expired for user {current_user.id} to course {course_id}")  # Логирование
-                return jsonify({'error': 'Access expired'}), 403
+        denied = check_course_access(current_user, course_id)
+        if denied:
+            return denied
+
+        etag = make_etag('course', course_id, course.content_version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
 
         # Формируем ответ с данными курса
         course_data = {
@@ -494,22 +538,74 @@ def get_course_detail(current_user, course_id):
             }
         }
 
-        print(f"Successfully retrieved course data: {course_data}")  # Логирование
-        return jsonify(course_data), 200
+        return set_etag(jsonify(course_data), etag), 200
 
     except SQLAlchemyError as e:
-        print(f"Database error in get_course_detail: {str(e)}")  # Подробное логирование SQL ошибок
+        logger.exception("Database error in get_course_detail")
         session.rollback()
         return jsonify({'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
-        print(f"Unexpected error in get_course_detail: {str(e)}")  # Подробное логирование общих ошибок
-        import traceback
-        print(traceback.format_exc())  # Печать полного стека ошибки
+        logger.exception("Unexpected error in get_course_detail")
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+@course_bp.route('/course/<int:course_id>/bundle', methods=['GET'])
+@token_required
+def get_course_bundle(current_user, course_id):
+    # Курс, его видео и PDF и срок доступа - одним ответом и двумя запросами
+    try:
+        columns = [Course.id, Course.title, Course.description, Course.thumbnail_url,
+                   Course.created_by, Course.created_at, Course.content_version]
+        if current_user.role != 'admin':
+            # Срок доступа читается тем же запросом, что и курс
+            columns.append(
+                select(func.max(CourseAccess.end_date))
+                .where(CourseAccess.user_id == current_user.id, CourseAccess.course_id == Course.id)
+                .scalar_subquery().label('access_expires')
+            )
+        course = session.execute(select(*columns).where(Course.id == course_id)).first()
+        if not course:
+            return jsonify({'error': 'Course not found'}), 404
+
+        access_expires = None
+        if current_user.role != 'admin':
+            access_expires = course.access_expires
+            if access_expires is None:
+                return jsonify({'error': 'No access to this course'}), 403
+            if access_expires < datetime.utcnow():
+                return jsonify({'error': 'Access expired'}), 403
+
+        etag = make_etag('bundle', course_id, course.content_version, access_expires)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        # Видео и PDF - одним UNION ALL
+        videos_data, pdfs_data = serialize_course_items(session.execute(course_items_query(course_id)).all())
+
+        bundle = {
+            'course': {
+                'id': course.id,
+                'title': course.title,
+                'description': course.description,
+                'thumbnail_url': course.thumbnail_url,
+                'created_by': course.created_by,
+                'created_at': course.created_at.isoformat() if course.created_at else None
+            },
+            'videos': videos_data,
+            'pdfs': pdfs_data,
+            'access_expires': access_expires.strftime('%Y-%m-%d %H:%M:%S') if access_expires else None
+        }
+        return set_etag(json_response(bundle), etag), 200
+
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @course_bp.route('/course/<int:course_id>/edit', methods=['PUT'])
 @admin_required
 def update_course(current_user, course_id):
+    old_file_path = None
+    new_file_path = None
     try:
         course = session.query(Course).filter_by(id=course_id).first()
         if not course:
@@ -519,11 +615,9 @@ def update_course(current_user, course_id):
         if 'thumbnail' in request.files:
             file = request.files['thumbnail']
             if file.filename != '' and allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
-                # Удаляем старый файл
-                delete_file(course.thumbnail_url)
-                    
-                file_path = save_file(file, COURSE_UPLOAD_FOLDER)
-                course.thumbnail_url = file_path
+                old_file_path = course.thumbnail_url
+                new_file_path = save_file(file)
+                course.thumbnail_url = new_file_path
         
         # Обновляем остальные поля
         if 'title' in request.form:
@@ -531,11 +625,18 @@ def update_course(current_user, course_id):
         if 'description' in request.form:
             course.description = request.form['description']
             
+        bump_course_version(course_id)
         session.commit()
+
+        # Старый файл освобождаем только после успешного коммита
+        if old_file_path:
+            delete_file(old_file_path)
         return jsonify({'message': 'Course updated successfully'}), 200
         
     except Exception as e:
         session.rollback()
+        if new_file_path:
+            delete_file(new_file_path)
         return jsonify({'error': str(e)}), 500
 
 @course_bp.route('/course/<int:course_id>', methods=['DELETE'])
@@ -543,48 +644,33 @@ def update_course(current_user, course_id):
 def delete_course(current_user, course_id):
     try:
         # Проверяем существование курса
-        course = session.query(Course).filter_by(id=course_id).first()
-        if not course:
+        if not lock_course(course_id):
             return jsonify({'error': 'Course not found'}), 404
 
-        # Удаляем файл thumbnail если он существует
-        if course.thumbnail_url:
-            delete_file(course.thumbnail_url)
-            
-        # Удаляем все видео курса
-        videos = session.query(Video).filter_by(course_id=course_id).all()
-        for video in videos:
-            if video.file_path:
-                delete_file(video.file_path)
-            if video.thumbnail_url:
-                delete_file(video.thumbnail_url)
-            session.delete(video)
-            
-        # Удаляем все PDF документы курса
-        pdfs = session.query(PdfDocument).filter_by(course_id=course_id).all()
-        for pdf in pdfs:
-            if pdf.file_path:
-                delete_file(pdf.file_path)
-            session.delete(pdf)
-
-        # Удаляем все записи о доступе к курсу
-        session.query(CourseAccess).filter_by(course_id=course_id).delete()
-        
-        # Удаляем сам курс
-        session.delete(course)
+        # Файлы курса ставятся в очередь в БД, до удаления строк; удаляет их фоновый поток после коммита
+        enqueue_course_files(course_id)
+
+        # Удаляем все связанное с курсом набором bulk-запросов в одной транзакции
+        course_video_ids = select(Video.id).where(Video.course_id == course_id)
+        session.query(Comment).filter(Comment.video_id.in_(course_video_ids)).delete(synchronize_session=False)
+        session.query(Video).filter_by(course_id=course_id).delete(synchronize_session=False)
+        session.query(PdfDocument).filter_by(course_id=course_id).delete(synchronize_session=False)
+        session.query(CourseAccess).filter_by(course_id=course_id).delete(synchronize_session=False)
+        session.query(Course).filter_by(id=course_id).delete(synchronize_session=False)
+
         session.commit()
+        notify_cleanup_worker()
+        invalidate_entitlements()
         
         return jsonify({'message': 'Course and all related content deleted successfully'}), 200
         
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"Database error in delete_course: {str(e)}")
+        logger.exception("Database error in delete_course")
         return jsonify({'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
         session.rollback()
-        print(f"Unexpected error in delete_course: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Unexpected error in delete_course")
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
     
 
@@ -607,8 +693,10 @@ def revoke_course_access(current_user):
             return jsonify({'error': 'Access record not found'}), 404
             
         # Удаляем запись о доступе
+        user_id = access.user_id
         session.delete(access)
         session.commit()
+        invalidate_entitlements(user_id)
         
         return jsonify({'message': 'Course access revoked successfully'}), 200
         
@@ -624,23 +712,12 @@ def grant_course_access(current_user):
         
         if not all(k in data for k in ['user_id', 'course_id', 'duration_days']):
             return jsonify({'error': 'Missing required fields'}), 400
-            
-        user = session.query(User).filter_by(id=data['user_id']).first()
-        course = session.query(Course).filter_by(id=data['course_id']).first()
-        
-        if not user or not course:
-            return jsonify({'error': 'User or course not found'}), 404
-            
-        end_date = datetime.utcnow() + timedelta(days=int(data['duration_days']))
-        
-        course_access = CourseAccess(
-            user_id=data['user_id'],
-            course_id=data['course_id'],
-            end_date=end_date
-        )
-        
-        session.add(course_access)
-        session.commit()
+
+        # Повторная выдача обновляет существующую запись, а не создает дубликат
+        result = apply_enrollment([data], 'grant')[0]
+        if result['status'] == 'error':
+            status = 404 if result['error'] == 'User or course not found' else 400
+            return jsonify({'error': result['error']}), status
         
         return jsonify({'message': 'Course access granted successfully'}), 201
         
@@ -648,65 +725,73 @@ def grant_course_access(current_user):
         session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@course_bp.route('/course/access/bulk', methods=['POST'])
+@admin_required
+def bulk_course_access(current_user):
+    try:
+        # CSV (text/csv) читается потоком: user_id,course_id[,action][,duration_days].
+        # Значения по умолчанию - в query string (?action=grant&duration_days=30)
+        if request.mimetype == 'text/csv':
+            rows = iter_csv_rows(request.stream)
+            default_action = request.args.get('action', 'grant')
+            default_duration = request.args.get('duration_days')
+        else:
+            data = request.get_json()
+            if not data or not isinstance(data.get('rows'), list):
+                return jsonify({'error': 'rows list is required'}), 400
+            rows = data['rows']
+            default_action = data.get('action', 'grant')
+            default_duration = data.get('duration_days')
+
+        results = apply_enrollment(rows, default_action, default_duration)
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        return jsonify({'results': results, 'summary': summary}), 200
+
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @course_bp.route('/course/<int:course_id>/videos', methods=['GET'])
 @token_required
 def get_course_videos(current_user, course_id):
     try:
-        print(f"Getting videos for course_id: {course_id}, user: {current_user.id}")  # Логирование
-        
         # Проверяем существование курса
-        course = session.query(Course).filter_by(id=course_id).first()
-        if not course:
-            print(f"Course not found: {course_id}")  # Логирование
+        version = get_course_version(course_id)
+        if version is None:
             return jsonify({'error': 'Course not found'}), 404
 
         # Проверяем доступ к курсу для студентов
-        if current_user.role != 'admin':
-            access = session.query(CourseAccess).filter_by(
-                user_id=current_user.id,
-                course_id=course_id
-            ).first()
-            
-            if not access:
-                print(f"No access for user {current_user.id} to course {course_id}")  # Логирование
-                return jsonify({'error': 'No access to this course'}), 403
-                
-            if access.end_date < datetime.utcnow():
-                print(f"Access expired for user {current_user.id} to course {course_id}")  # Логирование
-                return jsonify({'error': 'Access expired'}), 403
+        denied = check_course_access(current_user, course_id)
+        if denied:
+            return denied
+
+        etag = make_etag('videos', course_id, version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
 
         # Получаем видео курса
-        videos = session.query(Video).filter_by(course_id=course_id).order_by(Video.order).all()
-        
-        videos_data = [{
-            'id': video.id,
-            'title': video.title,
-            'file_path': video.file_path,
-            'thumbnail_url': video.thumbnail_url,
-            'order': video.order
-        } for video in videos]
+        rows = session.execute(course_videos_query(course_id)).all()
+        videos_data = serialize_videos(rows)
         
-        print(f"Successfully retrieved {len(videos_data)} videos")  # Логирование
-        return jsonify({'videos': videos_data}), 200
+        logger.debug("Retrieved %d videos of course %s for user %s", len(videos_data), course_id, current_user.id)
+        return set_etag(json_response({'videos': videos_data}), etag), 200
 
     except SQLAlchemyError as e:
-        print(f"Database error in get_course_videos: {str(e)}")  # Подробное логирование SQL ошибок
+        logger.exception("Database error in get_course_videos")
         session.rollback()
         return jsonify({'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
-        print(f"Unexpected error in get_course_videos: {str(e)}")  # Подробное логирование общих ошибок
-        import traceback
-        print(traceback.format_exc())  # Печать полного стека ошибки
+        logger.exception("Unexpected error in get_course_videos")
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
 @course_bp.route('/course/<int:course_id>/video', methods=['POST'])
 @admin_required
 def add_video(current_user, course_id):
     try:
-        course = session.query(Course).filter_by(id=course_id).first()
-        if not course:
-            return jsonify({'error': 'Course not found'}), 404
-
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
@@ -716,7 +801,7 @@ def add_video(current_user, course_id):
         video_source = data.get('video_source')
         thumbnail_url = data.get('thumbnail_url', '')
 
-        print(f"Received data: title={title}, video_url={video_url}, source={video_source}")
+        logger.debug("Adding video to course %s: title=%s, source=%s", course_id, title, video_source)
 
         if not all([title, video_url, video_source]):
             return jsonify({'error': 'Title, video URL and source are required'}), 400
@@ -727,20 +812,33 @@ def add_video(current_user, course_id):
             return jsonify({'error': f'Invalid video source. Must be one of: {", ".join(valid_sources)}'}), 400
 
         try:
-            last_video = session.query(Video).filter_by(course_id=course_id).order_by(Video.order.desc()).first()
-            next_order = (last_video.order + 1) if last_video else 1
-
-            # Создаем новое видео с явным указанием типа
+            # Проверяем существование курса и блокируем его до коммита
+            if not lock_course(course_id):
+                return jsonify({'error': 'Course not found'}), 404
+
+            # Локальные файлы видео и обложки получают ссылки в той же транзакции
+            try:
+                if video_source == 'local':
+                    retain_file(video_url, session)
+                retain_file(thumbnail_url, session)
+            except ValueError as e:
+                session.rollback()
+                return jsonify({'error': str(e)}), 400
+
+            # Создаем новое видео с явным указанием типа - в конец списка
             new_video = Video(
                 title=title,
                 file_path=video_url,
                 thumbnail_url=thumbnail_url,
                 course_id=course_id,
-                order=next_order,
+                order=next_rank(Video, course_id),
                 video_source=str(video_source)  # Явно преобразуем в строку
             )
             
             session.add(new_video)
+            session.flush()
+            next_order = get_position(Video, new_video)
+            bump_course_version(course_id)
             session.commit()
             
             return jsonify({
@@ -757,12 +855,12 @@ def add_video(current_user, course_id):
             
         except SQLAlchemyError as e:
             session.rollback()
-            print(f"Database error in add_video: {str(e)}")
+            logger.exception("Database error in add_video")
             return jsonify({'error': f'Database error: {str(e)}'}), 500
             
     except Exception as e:
         session.rollback()
-        print(f"Error in add_video: {str(e)}")
+        logger.exception("Error in add_video")
         return jsonify({'error': str(e)}), 500
 
 @course_bp.route('/course/<int:course_id>/video/<int:video_id>', methods=['DELETE'])
@@ -778,6 +876,7 @@ def delete_video(current_user, course_id, video_id):
             
         # Удаляем видео из базы данных
         session.delete(video)
+        bump_course_version(course_id)
         session.commit()
         
         return jsonify({'message': 'Video deleted successfully'}), 200
@@ -786,6 +885,23 @@ def delete_video(current_user, course_id, video_id):
         session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@course_bp.route('/course/<int:course_id>/videos/order', methods=['PUT'])
+@admin_required
+def reorder_videos(current_user, course_id):
+    return reorder_course_items(Video, course_id)
+
+def get_comments_page(video_id, after, limit):
+    # Новые комментарии первыми; курсор - (created_at, id) последнего комментария страницы
+    if after is not None:
+        try:
+            after = (datetime.fromisoformat(after[0]), int(after[1]))
+        except (TypeError, ValueError):
+            raise PaginationError('Invalid cursor')
+
+    rows = session.execute(comments_query(video_id, after).limit(limit + 1)).all()
+    rows, next_cursor = split_page(rows, limit, lambda row: (row[2].isoformat(), row[0]))
+    return serialize_comments(rows), next_cursor
+
 @course_bp.route('/course/<int:course_id>/video/<int:video_id>', methods=['GET'])
 @token_required
 def video_detail(current_user, course_id, video_id):
@@ -795,42 +911,53 @@ def video_detail(current_user, course_id, video_id):
             return jsonify({'error': 'Video not found'}), 404
             
         # Проверяем доступ к курсу
-        if current_user.role != 'admin':
-            access = session.query(CourseAccess).filter_by(
-                user_id=current_user.id,
-                course_id=video.course_id
-            ).first()
-            
-            if not access:
-                return jsonify({'error': 'No access to this video'}), 403
-            
-        # Получаем комментарии к видео с информацией о пользователях
-        comments = session.query(Comment, User).join(User, Comment.user_id == User.id)\
-            .filter(Comment.video_id == video_id)\
-            .order_by(Comment.created_at.desc()).all()
+        denied = check_course_access(current_user, video.course_id, 'No access to this video')
+        if denied:
+            return denied
             
-        comments_data = [{
-            'id': comment.id,
-            'text': comment.text,
-            'user_name': user.first_name,
-            'created_at': comment.created_at.isoformat()
-        } for comment, user in comments]
+        # Только первая страница комментариев, остальные - через /comments
+        comments_count = session.query(func.count(Comment.id)).filter(Comment.video_id == video_id).scalar()
+        comments_data, next_cursor = get_comments_page(video_id, None, Config.COMMENTS_PAGE_SIZE)
             
         video_data = {
             'id': video.id,
             'title': video.title,
             'file_path': video.file_path,
             'thumbnail_url': video.thumbnail_url,
-            'order': video.order,
+            'order': get_position(Video, video),
             'course_id': video.course_id,
-            'comments': comments_data
+            'comments_count': comments_count,
+            'comments': comments_data,
+            'comments_next_cursor': next_cursor
         }
         
-        return jsonify({'video': video_data}), 200
+        return json_response({'video': video_data}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@course_bp.route('/course/<int:course_id>/video/<int:video_id>/comments', methods=['GET'])
+@token_required
+def get_video_comments(current_user, course_id, video_id):
+    try:
+        video_course_id = session.query(Video.course_id).filter_by(id=video_id).scalar()
+        if video_course_id is None:
+            return jsonify({'error': 'Video not found'}), 404
+
+        denied = check_course_access(current_user, video_course_id, 'No access to this video')
+        if denied:
+            return denied
+
+        after, limit = get_page_args(Config.COMMENTS_PAGE_SIZE, cursor_size=2)
+        comments_data, next_cursor = get_comments_page(video_id, after, limit)
+
+        return json_response({'comments': comments_data, 'next_cursor': next_cursor}), 200
+
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @course_bp.route('/course/<int:course_id>/video/<int:video_id>/comment', methods=['POST'])
 @token_required
 def add_comment(current_user, course_id, video_id):
@@ -843,15 +970,10 @@ def add_comment(current_user, course_id, video_id):
         if not video:
             return jsonify({'error': 'Video not found'}), 404
             
-        # Проверяем доступ к курсу
-        if current_user.role != 'admin':
-            access = session.query(CourseAccess).filter_by(
-                user_id=current_user.id,
-                course_id=course_id
-            ).first()
-            
-            if not access:
-                return jsonify({'error': 'No access to this video'}), 403
+        # Проверяем доступ к курсу, которому принадлежит видео
+        denied = check_course_access(current_user, video.course_id, 'No access to this video')
+        if denied:
+            return denied
                 
         new_comment = Comment(
             text=data['text'],
@@ -877,10 +999,37 @@ def add_comment(current_user, course_id, video_id):
         session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@course_bp.route('/imagekit/uploads', methods=['POST'])
+@admin_required
+def start_imagekit_upload(current_user):
+    try:
+        file = request.files.get('image')
+        if not file or file.filename == '' or not allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
+            return jsonify({'error': 'Valid image file is required'}), 400
+
+        job_id = start_upload_job(file, request.form.get('folder', '/'))
+        return jsonify({'job_id': job_id, 'status': 'pending'}), 202
+
+    except ImageKitUploadError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@course_bp.route('/imagekit/uploads/<job_id>', methods=['GET'])
+@admin_required
+def get_imagekit_upload(current_user, job_id):
+    job = get_upload_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Upload job not found'}), 404
+    return jsonify(job), 200
+
 @course_bp.route('/uploads/<path:filename>')
 @token_required
 def serve_file(current_user, filename):
     try:
-        return send_file(os.path.join(UPLOAD_FOLDER, filename))
+        file_path = safe_join(UPLOAD_FOLDER, filename)
+        if file_path is None or not os.path.isfile(file_path):
+            return jsonify({'error': 'File not found'}), 404
+        return send_local_file(file_path)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
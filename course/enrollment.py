@@ -0,0 +1,138 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from itertools import islice
+from sqlalchemy import tuple_
+from models import session, User, Course, CourseAccess, dialect_insert
+from config import Config
+from .access import invalidate_entitlements
+
+ACTIONS = ('grant', 'extend', 'revoke')
+
+
+def iter_csv_rows(stream):
+    # Читаем CSV из потока запроса построчно, не загружая тело целиком
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield {key.strip(): (value.strip() if isinstance(value, str) else value)
+               for key, value in row.items() if key}
+
+
+def _parse_row(row, default_action, default_duration):
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object')
+    action = row.get('action') or default_action
+    if action not in ACTIONS:
+        raise ValueError(f'Invalid action. Must be one of: {", ".join(ACTIONS)}')
+    try:
+        user_id = int(row['user_id'])
+        course_id = int(row['course_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('user_id and course_id must be integers')
+
+    duration_days = None
+    if action != 'revoke':
+        duration_days = row.get('duration_days')
+        if duration_days in (None, ''):
+            duration_days = default_duration
+        try:
+            duration_days = int(duration_days)
+        except (TypeError, ValueError):
+            raise ValueError('duration_days must be an integer')
+    return action, user_id, course_id, duration_days
+
+
+def _apply_batch(batch, default_action, default_duration):
+    results = {}
+    parsed = []
+    for index, row in batch:
+        try:
+            parsed.append((index, *_parse_row(row, default_action, default_duration)))
+        except ValueError as e:
+            results[index] = {'row': index, 'status': 'error', 'error': str(e)}
+
+    # Проверяем существование пользователей и курсов двумя запросами на весь батч
+    user_ids = {item[2] for item in parsed}
+    course_ids = {item[3] for item in parsed}
+    known_users = {user_id for (user_id,) in session.query(User.id).filter(User.id.in_(user_ids))} if user_ids else set()
+    known_courses = {course_id for (course_id,) in session.query(Course.id).filter(Course.id.in_(course_ids))} if course_ids else set()
+
+    pairs = {(item[2], item[3]) for item in parsed if item[2] in known_users and item[3] in known_courses}
+    current = {}
+    if pairs:
+        current = {
+            (user_id, course_id): end_date
+            for user_id, course_id, end_date in session.query(
+                CourseAccess.user_id, CourseAccess.course_id, CourseAccess.end_date
+            ).filter(tuple_(CourseAccess.user_id, CourseAccess.course_id).in_(list(pairs)))
+        }
+
+    # Строки применяются по порядку; итоговое состояние пары пишется одним upsert/delete
+    now = datetime.utcnow()
+    state = dict(current)
+    for index, action, user_id, course_id, duration_days in parsed:
+        result = {'row': index, 'user_id': user_id, 'course_id': course_id, 'action': action}
+        results[index] = result
+        if user_id not in known_users or course_id not in known_courses:
+            result.update(status='error', error='User or course not found')
+            continue
+
+        pair = (user_id, course_id)
+        end_date = state.get(pair)
+        if action == 'revoke':
+            if end_date is None:
+                result.update(status='error', error='Access record not found')
+                continue
+            state[pair] = None
+            result['status'] = 'revoked'
+        else:
+            if action == 'extend' and end_date is not None:
+                end_date = max(end_date, now) + timedelta(days=duration_days)
+                result['status'] = 'extended'
+            else:
+                # Выдача не сокращает уже действующий доступ: остается более поздний срок
+                granted_until = now + timedelta(days=duration_days)
+                end_date = granted_until if end_date is None else max(end_date, granted_until)
+                result['status'] = 'granted'
+            state[pair] = end_date
+            result['end_date'] = end_date.isoformat()
+
+    upserts = [
+        {'user_id': pair[0], 'course_id': pair[1], 'start_date': now, 'end_date': end_date}
+        for pair, end_date in state.items()
+        if end_date is not None and current.get(pair) != end_date
+    ]
+    revoked = [pair for pair, end_date in state.items() if end_date is None and pair in current]
+
+    if upserts:
+        insert = dialect_insert(CourseAccess.__table__, session.get_bind())
+        session.execute(insert.values(upserts).on_conflict_do_update(
+            index_elements=['user_id', 'course_id'],
+            set_={'end_date': insert.excluded.end_date}
+        ))
+    if revoked:
+        session.query(CourseAccess).filter(
+            tuple_(CourseAccess.user_id, CourseAccess.course_id).in_(revoked)
+        ).delete(synchronize_session=False)
+    session.commit()
+
+    for user_id in {pair[0] for pair in state}:
+        invalidate_entitlements(user_id)
+    return [results[index] for index, _ in batch]
+
+
+# Применяет строки {user_id, course_id, action?, duration_days?} батчами по BULK_BATCH_SIZE,
+# каждый батч - отдельная транзакция. Возвращает результат по каждой строке
+def apply_enrollment(rows, default_action='grant', default_duration=None):
+    results = []
+    rows = enumerate(rows)
+    while True:
+        batch = list(islice(rows, Config.BULK_BATCH_SIZE))
+        if not batch:
+            break
+        try:
+            results.extend(_apply_batch(batch, default_action, default_duration))
+        except Exception as e:
+            session.rollback()
+            results.extend({'row': index, 'status': 'error', 'error': f'Batch failed: {str(e)}'} for index, _ in batch)
+    return results
@@ -0,0 +1,34 @@
+import hashlib
+from flask import request, make_response
+from models import session, Course
+
+
+# Вызывается в той же транзакции, что и изменение курса / его видео / PDF
+def bump_course_version(course_id):
+    session.query(Course).filter(Course.id == course_id).update(
+        {Course.content_version: Course.content_version + 1},
+        synchronize_session=False
+    )
+
+
+# None, если курса нет
+def get_course_version(course_id):
+    return session.query(Course.content_version).filter(Course.id == course_id).scalar()
+
+
+def make_etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+# 304 Not Modified, если клиент прислал совпадающий If-None-Match, иначе None
+def not_modified(etag):
+    if request.if_none_match.contains(etag):
+        return set_etag(make_response('', 304), etag)
+    return None
+
+
+def set_etag(response, etag):
+    response.set_etag(etag)
+    # Ответы зависят от пользователя - кэшировать только в браузере и всегда ревалидировать
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
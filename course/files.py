@@ -0,0 +1,113 @@
+import mimetypes
+import os
+import unicodedata
+from urllib.parse import quote
+from flask import request, Response
+from werkzeug.wsgi import wrap_file
+from config import Config
+
+
+def _file_etag(stat):
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def _content_disposition(response, as_attachment, download_name):
+    value = 'attachment' if as_attachment else 'inline'
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        response.headers.set('Content-Disposition', value, filename=simple,
+                             **{'filename*': "UTF-8''" + quote(download_name, safe='')})
+    else:
+        response.headers.set('Content-Disposition', value, filename=download_name)
+
+
+def _read_range(f, length, chunk_size):
+    try:
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+# If-Range: диапазон отдаем, только если файл не изменился с момента первого ответа
+def _if_range_matches(etag, stat):
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == etag
+    if if_range.date:
+        return int(if_range.date.timestamp()) == int(stat.st_mtime)
+    return True
+
+
+def _offload_header(path):
+    mode = Config.FILE_SERVING_MODE
+    if mode == 'x-sendfile':
+        return 'X-Sendfile', os.path.abspath(path)
+    if mode == 'x-accel':
+        root = os.path.abspath(Config.UPLOAD_FOLDER)
+        full_path = os.path.abspath(path)
+        if os.path.commonpath([root, full_path]) == root:
+            relative = os.path.relpath(full_path, root).replace(os.sep, '/')
+            return 'X-Accel-Redirect', Config.X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(relative)
+    return None
+
+
+# Отдает локальный файл с поддержкой Range / If-Range / If-None-Match.
+# Проверка прав должна быть выполнена до вызова
+def send_local_file(path, mimetype=None, as_attachment=False, download_name=None):
+    stat = os.stat(path)
+    etag = _file_etag(stat)
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    offload = _offload_header(path)
+    if offload:
+        # Байты (и Range) отдает фронтовой прокси
+        response = Response(mimetype=mimetype)
+        response.headers[offload[0]] = offload[1]
+    elif request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = _file_response(path, stat, etag, mimetype)
+
+    if download_name:
+        _content_disposition(response, as_attachment, download_name)
+    response.set_etag(etag)
+    response.last_modified = stat.st_mtime
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _file_response(path, stat, etag, mimetype):
+    size = stat.st_size
+    start, stop, status = 0, size, 200
+
+    if request.range and request.range.units == 'bytes' and len(request.range.ranges) == 1 \
+            and _if_range_matches(etag, stat):
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        start, stop = byte_range
+        status = 206
+
+    f = open(path, 'rb')
+    f.seek(start)
+    if stop == size:
+        # До конца файла: отдаем через wsgi.file_wrapper, gunicorn использует os.sendfile
+        body = wrap_file(request.environ, f, Config.FILE_CHUNK_SIZE)
+    else:
+        body = _read_range(f, stop - start, Config.FILE_CHUNK_SIZE)
+
+    response = Response(body, status=status, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = stop - start
+    response.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    return response
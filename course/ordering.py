@@ -0,0 +1,147 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, case, and_, or_
+from models import session, SessionLocal, Course
+
+# Порядок видео и PDF хранится разреженными рангами (order = 1024, 2048, ...).
+# Добавление - max + RANK_GAP, перемещение - середина между соседями, удаление
+# ничего не перенумеровывает: каждая операция меняет одну строку.
+# Клиентам отдается позиция в списке (1, 2, 3, ...), а не сам ранг
+RANK_GAP = 1024
+# Если после перемещения зазор между соседями меньше - курс перенумеровывается в фоне
+MIN_GAP = 8
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def ordered(query, model):
+    # id - второй ключ: при равных рангах порядок все равно детерминирован
+    return query.order_by(model.order, model.id)
+
+
+# Блокирует строку курса до конца транзакции: добавления и перемещения
+# в одном курсе выполняются по очереди. False, если курса нет
+def lock_course(course_id, db=None):
+    db = db or session
+    return db.query(Course.id).filter(Course.id == course_id).with_for_update().first() is not None
+
+
+def next_rank(model, course_id):
+    max_rank = session.query(func.max(model.order)).filter(model.course_id == course_id).scalar()
+    return RANK_GAP if max_rank is None else max_rank + RANK_GAP
+
+
+# Позиция элемента в списке курса, начиная с 1
+def get_position(model, item):
+    return session.query(func.count(model.id)).filter(
+        model.course_id == item.course_id,
+        or_(model.order < item.order, and_(model.order == item.order, model.id < item.id))
+    ).scalar() + 1
+
+
+def _neighbors(model, item, position):
+    # Ранги элементов, между которыми окажется item на позиции position (без самого item)
+    query = ordered(session.query(model.order).filter(
+        model.course_id == item.course_id, model.id != item.id
+    ), model)
+    if position <= 1:
+        after = query.limit(1).scalar()
+        return None, after
+    rows = [rank for (rank,) in query.offset(position - 2).limit(2)]
+    before = rows[0] if rows else session.query(func.max(model.order)).filter(
+        model.course_id == item.course_id, model.id != item.id
+    ).scalar()
+    after = rows[1] if len(rows) > 1 else None
+    return before, after
+
+
+def _rank_between(before, after):
+    if after is None:
+        return (before or 0) + RANK_GAP
+    low = before if before is not None else 0
+    if after - low < 2:
+        return None
+    return (low + after) // 2
+
+
+# Перемещает item на позицию position (с 1) внутри курса. Курс должен быть заблокирован
+def move_item(model, item, position):
+    before, after = _neighbors(model, item, position)
+    rank = _rank_between(before, after)
+    if rank is None:
+        # Зазор исчерпан - перенумеровываем курс прямо в транзакции и пробуем снова
+        rebalance(model, item.course_id)
+        # Только ранг: остальные несохраненные изменения item (например, title) не теряются
+        session.refresh(item, ['order'])
+        before, after = _neighbors(model, item, position)
+        rank = _rank_between(before, after)
+    elif after is not None and min(rank - (before or 0), after - rank) < MIN_GAP:
+        schedule_rebalance(model, item.course_id)
+    item.order = rank
+    return rank
+
+
+# Применяет порядок ids одним UPDATE с CASE
+def apply_order(model, course_id, ids, db=None):
+    db = db or session
+    ranks = {item_id: (index + 1) * RANK_GAP for index, item_id in enumerate(ids)}
+    if not ranks:
+        return 0
+    return db.query(model).filter(model.course_id == course_id, model.id.in_(ranks)).update(
+        {model.order: case(ranks, value=model.id)},
+        synchronize_session=False
+    )
+
+
+def rebalance(model, course_id, db=None):
+    db = db or session
+    ids = [item_id for (item_id,) in ordered(db.query(model.id).filter(model.course_id == course_id), model)]
+    return apply_order(model, course_id, ids, db)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-rebalance')
+    return _executor
+
+
+# Поток перенумерации не переживает fork - в дочернем процессе он создается заново
+def reset_after_fork():
+    global _executor, _executor_lock, _pending_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _pending_lock = threading.Lock()
+    _pending.clear()
+
+
+def _run_rebalance(model, course_id):
+    with _pending_lock:
+        _pending.discard((model, course_id))
+    db = SessionLocal()
+    try:
+        if lock_course(course_id, db):
+            rebalance(model, course_id, db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Order rebalance failed for %s of course %s", model.__tablename__, course_id)
+    finally:
+        db.close()
+
+
+# Фоновая перенумерация курса; повторные запросы для того же курса схлопываются
+def schedule_rebalance(model, course_id):
+    with _pending_lock:
+        if (model, course_id) in _pending:
+            return
+        _pending.add((model, course_id))
+    _get_executor().submit(_run_rebalance, model, course_id)
@@ -0,0 +1,127 @@
+from sqlalchemy import select, func, or_, and_, union_all, literal_column, null
+from models import User, Course, CourseAccess, Video, PdfDocument, Comment
+
+# Запросы списков - только нужные колонки (Core select, строки-кортежи без ORM-объектов)
+# и сериализаторы строк в dict по индексу колонки.
+# Порядок колонок в select и индексы в serialize_* должны совпадать
+
+
+def users_query(role=None, email_prefix=None, name_prefix=None):
+    query = select(User.id, User.email, User.first_name, User.role)
+    if role:
+        query = query.where(User.role == role)
+    if email_prefix:
+        query = query.where(User.email.startswith(email_prefix, autoescape=True))
+    if name_prefix:
+        query = query.where(User.first_name.startswith(name_prefix, autoescape=True))
+    return query
+
+
+def count_query(query):
+    return select(func.count()).select_from(query.order_by(None).subquery())
+
+
+def serialize_users(rows):
+    return [{'id': row[0], 'email': row[1], 'first_name': row[2], 'role': row[3]} for row in rows]
+
+
+def courses_query(user_id=None, active_since=None):
+    columns = (Course.id, Course.title, Course.description, Course.thumbnail_url)
+    if user_id is None:
+        return select(*columns)
+    # Для студента - только курсы с доступом, срок доступа - пятая колонка
+    query = select(*columns, func.max(CourseAccess.end_date))\
+        .join(CourseAccess, CourseAccess.course_id == Course.id)\
+        .where(CourseAccess.user_id == user_id)
+    if active_since is not None:
+        query = query.where(CourseAccess.end_date >= active_since)
+    return query.group_by(*columns)
+
+
+def serialize_courses(rows, with_access=False):
+    if not with_access:
+        return [{'id': row[0], 'title': row[1], 'description': row[2], 'thumbnail_url': row[3]} for row in rows]
+    return [{
+        'id': row[0], 'title': row[1], 'description': row[2], 'thumbnail_url': row[3],
+        'access_expires': row[4].strftime('%Y-%m-%d %H:%M:%S')
+    } for row in rows]
+
+
+# Отпечаток списка курсов для ETag: (count, max(id), sum(content_version))
+def courses_fingerprint_query(course_ids=None):
+    query = select(func.count(Course.id), func.max(Course.id), func.sum(Course.content_version))
+    if course_ids is not None:
+        query = query.where(Course.id.in_(list(course_ids)))
+    return query
+
+
+# Доступы пользователя: (course_id, end_date) - по одной строке на курс
+def entitlements_query(user_id):
+    return select(CourseAccess.course_id, func.max(CourseAccess.end_date))\
+        .where(CourseAccess.user_id == user_id)\
+        .group_by(CourseAccess.course_id)
+
+
+def course_videos_query(course_id):
+    return select(Video.id, Video.title, Video.file_path, Video.thumbnail_url)\
+        .where(Video.course_id == course_id)\
+        .order_by(Video.order, Video.id)
+
+
+# order - позиция в списке (с 1), строки должны идти в порядке списка
+def serialize_videos(rows):
+    return [{
+        'id': row[0], 'title': row[1], 'file_path': row[2], 'thumbnail_url': row[3], 'order': position
+    } for position, row in enumerate(rows, 1)]
+
+
+def course_pdfs_query(course_id):
+    return select(PdfDocument.id, PdfDocument.title, PdfDocument.file_path, PdfDocument.created_at)\
+        .where(PdfDocument.course_id == course_id)\
+        .order_by(PdfDocument.order, PdfDocument.id)
+
+
+def serialize_pdfs(rows):
+    return [{
+        'id': row[0], 'title': row[1], 'file_path': row[2], 'order': position, 'created_at': row[3]
+    } for position, row in enumerate(rows, 1)]
+
+
+# Видео и PDF курса одним UNION ALL: (kind, id, title, file_path, thumbnail_url, created_at)
+def course_items_query(course_id):
+    items = union_all(
+        select(literal_column("'video'").label('kind'), Video.id, Video.title, Video.file_path,
+               Video.thumbnail_url, Video.created_at, Video.order)
+        .where(Video.course_id == course_id),
+        select(literal_column("'pdf'").label('kind'), PdfDocument.id, PdfDocument.title, PdfDocument.file_path,
+               null().label('thumbnail_url'), PdfDocument.created_at, PdfDocument.order)
+        .where(PdfDocument.course_id == course_id)
+    ).subquery()
+    return select(items.c.kind, items.c.id, items.c.title, items.c.file_path,
+                  items.c.thumbnail_url, items.c.created_at)\
+        .order_by(items.c.order, items.c.id)
+
+
+# Возвращает (videos, pdfs) в формате serialize_videos / serialize_pdfs
+def serialize_course_items(rows):
+    videos = [(row[1], row[2], row[3], row[4]) for row in rows if row[0] == 'video']
+    pdfs = [(row[1], row[2], row[3], row[5]) for row in rows if row[0] == 'pdf']
+    return serialize_videos(videos), serialize_pdfs(pdfs)
+
+
+# Новые комментарии первыми; after - (created_at, id) последнего комментария предыдущей страницы
+def comments_query(video_id, after=None):
+    query = select(Comment.id, Comment.text, Comment.created_at, User.first_name)\
+        .join(User, Comment.user_id == User.id)\
+        .where(Comment.video_id == video_id)
+    if after is not None:
+        created_at, comment_id = after
+        query = query.where(or_(
+            Comment.created_at < created_at,
+            and_(Comment.created_at == created_at, Comment.id < comment_id)
+        ))
+    return query.order_by(Comment.created_at.desc(), Comment.id.desc())
+
+
+def serialize_comments(rows):
+    return [{'id': row[0], 'text': row[1], 'user_name': row[3], 'created_at': row[2]} for row in rows]
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import re
+import tempfile
+from sqlalchemy import select, update, delete, and_
+from werkzeug.utils import secure_filename
+from models import get_engine, StoredFile, dialect_insert
+from config import Config
+
+# Файлы хранятся по sha256 содержимого: uploads/objects/ab/cd/abcd...<ext>.
+# Одинаковые загрузки дедуплицируются, байты удаляются, когда на них не осталось ссылок
+OBJECTS_FOLDER = os.path.join(Config.UPLOAD_FOLDER, 'objects')
+TMP_FOLDER = os.path.join(Config.UPLOAD_FOLDER, 'tmp')
+
+_OBJECT_NAME = re.compile(r'^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$')
+
+
+def object_path(sha256, ext=''):
+    return os.path.join(OBJECTS_FOLDER, sha256[:2], sha256[2:4], sha256 + ext)
+
+
+# Внешние ссылки (YouTube, ImageKit, ...) не являются локальными файлами
+def is_local_path(file_path):
+    return bool(file_path) and '://' not in file_path
+
+
+# То же условие в SQL - для отбора путей прямо в БД
+def local_path_clause(column):
+    return and_(column.isnot(None), column != '', ~column.contains('://', autoescape=True))
+
+
+def _in_objects(file_path):
+    root = os.path.abspath(OBJECTS_FOLDER)
+    return os.path.commonpath([root, os.path.abspath(file_path)]) == root
+
+
+# (sha256, ext) объекта хранилища или None для прочих путей
+def _object_key(file_path):
+    if not _in_objects(file_path):
+        return None
+    match = _OBJECT_NAME.match(os.path.basename(file_path))
+    return (match.group(1), match.group(2) or '') if match else None
+
+
+def _key_clause(key):
+    return and_(StoredFile.sha256 == key[0], StoredFile.ext == key[1])
+
+
+def _write_temp(file):
+    # Пишем поток загрузки на диск кусками, параллельно считая sha256
+    os.makedirs(TMP_FOLDER, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=TMP_FOLDER)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(Config.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def save_file(file):
+    ext = os.path.splitext(secure_filename(file.filename))[1].lower()
+    tmp_path, sha256, size = _write_temp(file)
+    try:
+        # Файл кладется на место внутри транзакции: блокировка строки stored_files
+        # не дает параллельному delete_file удалить те же байты
+        with get_engine().begin() as conn:
+            insert = dialect_insert(StoredFile.__table__, conn)
+            conn.execute(insert.values(
+                sha256=sha256,
+                ext=ext,
+                path=object_path(sha256, ext),
+                size=size,
+                ref_count=1
+            ).on_conflict_do_update(
+                index_elements=['sha256', 'ext'],
+                set_={'ref_count': StoredFile.__table__.c.ref_count + 1}
+            ))
+            file_path = conn.execute(select(StoredFile.path).where(_key_clause((sha256, ext)))).scalar()
+
+            if not os.path.exists(file_path):
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return file_path
+
+
+# Путь, присланный клиентом (а не полученный из save_file в этом же запросе), перед записью
+# в строку: объект хранилища получает +1 к ref_count в транзакции conn (сессии или соединения)
+# вызывающего, иначе удаление записи освободило бы чужие байты. Пути внутри objects/, которых
+# нет в stored_files, отклоняются. Прочие значения (URL, старые пути) - как раньше
+def retain_file(file_path, conn):
+    if not is_local_path(file_path):
+        return
+    if not _in_objects(file_path):
+        return
+    key = _object_key(file_path)
+    if key is not None:
+        result = conn.execute(
+            update(StoredFile)
+            .where(_key_clause(key), StoredFile.ref_count > 0)
+            .values(ref_count=StoredFile.ref_count + 1)
+        )
+        if result.rowcount == 1:
+            return
+    raise ValueError(f'Unknown file: {file_path}')
+
+
+# Снимает одну ссылку на файл. С conn - в транзакции вызывающего (очередь очистки): тогда
+# возвращает пути, которые нужно передать в purge_files после ее коммита. Байты никогда не
+# удаляются до коммита уменьшения ref_count - иначе откат оставил бы ссылку на удаленный файл
+def delete_file(file_path, conn=None):
+    if conn is None:
+        with get_engine().begin() as conn:
+            released = delete_file(file_path, conn)
+        purge_files(released)
+        return []
+
+    if not file_path:
+        return []
+
+    key = _object_key(file_path)
+    if key is None:
+        # Файлы, загруженные до content-addressed хранилища (внешние URL просто не существуют на диске)
+        return [file_path]
+
+    conn.execute(
+        update(StoredFile)
+        .where(_key_clause(key))
+        .values(ref_count=StoredFile.ref_count - 1)
+    )
+    remaining = conn.execute(select(StoredFile.ref_count).where(_key_clause(key))).scalar()
+    return [file_path] if remaining is not None and remaining <= 0 else []
+
+
+# Удаляет байты файлов без ссылок. Строка stored_files с ref_count <= 0 остается до этого момента
+# и блокируется здесь: параллельный save_file того же содержимого либо ждет и кладет файл заново,
+# либо успевает поднять ref_count - и тогда файл не удаляется
+def purge_files(file_paths):
+    for file_path in file_paths:
+        key = _object_key(file_path)
+        if key is None:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            continue
+
+        with get_engine().begin() as conn:
+            remaining = conn.execute(
+                select(StoredFile.ref_count).where(_key_clause(key)).with_for_update()
+            ).scalar()
+            if remaining is not None and remaining <= 0:
+                conn.execute(delete(StoredFile).where(_key_clause(key)))
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+
+# Файлы, чьи ссылки сняты, но байты не удалены (процесс упал между коммитом и purge_files)
+def purge_unreferenced(limit=100):
+    with get_engine().connect() as conn:
+        paths = [path for (path,) in conn.execute(
+            select(StoredFile.path).where(StoredFile.ref_count <= 0).limit(limit)
+        )]
+    purge_files(paths)
+    return len(paths)
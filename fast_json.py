@@ -0,0 +1,69 @@
+import json
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app
+from config import Config
+from metrics import add_serialize_time
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость, без нее работает stdlib json
+    orjson = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2
+    DefaultJSONProvider = None
+
+
+def _select_backend(name):
+    if name == 'orjson' and orjson is None:
+        raise ImportError('JSON_BACKEND=orjson, but orjson is not installed')
+    if name in ('auto', 'orjson') and orjson is not None:
+        return 'orjson'
+    return 'stdlib'
+
+
+BACKEND = _select_backend(Config.JSON_BACKEND)
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+# Сериализует в bytes; datetime - в ISO 8601 (как isoformat()) в обоих бэкендах
+def dumps(data, backend=None):
+    if (backend or BACKEND) == 'orjson':
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# Замена jsonify для больших ответов: без сортировки ключей и отступов
+def json_response(data):
+    started = time.perf_counter()
+    body = dumps(data)
+    add_serialize_time(time.perf_counter() - started)
+    return current_app.response_class(body, mimetype='application/json')
+
+
+if DefaultJSONProvider is not None:
+    # Flask >= 2.2: jsonify во всем приложении идет через выбранный бэкенд
+    class FastJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return dumps(obj).decode('utf-8')
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def init_app(app):
+    # На Flask < 2.2 провайдеров нет: jsonify остается на stdlib,
+    # списки отдаются через json_response
+    if DefaultJSONProvider is not None:
+        app.json = FastJSONProvider(app)
@@ -0,0 +1,96 @@
+# Конфигурация gunicorn:  gunicorn -c gunicorn.conf.py app:app
+# ASGI-режим (asgi.py):   GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+#
+# Числа воркеров и потоков выводятся из числа ядер, переопределяются WEB_CONCURRENCY / GUNICORN_THREADS
+import logging
+import math
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# gthread: процессы - по ядрам (CPU), потоки - ожидание БД и ImageKit внутри процесса
+if worker_class == 'sync':
+    workers = int(os.getenv('WEB_CONCURRENCY', '0')) or cpu_count * 2 + 1
+else:
+    workers = int(os.getenv('WEB_CONCURRENCY', '0')) or cpu_count + 1
+# Потоки gthread: всего около 4 запросов в работе на ядро (остальное время поток ждет БД),
+# поровну между воркерами, но не меньше 2 на воркер
+threads = int(os.getenv('GUNICORN_THREADS', '0')) or \
+    (max(2, math.ceil(cpu_count * 4 / workers)) if worker_class == 'gthread' else 1)
+
+# Ресурсы, которые Config выделяет на процесс, делим между воркерами, если они не заданы явно
+# (config.py читается при загрузке приложения - уже после этого файла):
+# процессы хэширования паролей - всего примерно по числу ядер,
+# соединения с БД - по числу потоков воркера
+os.environ.setdefault('PASSWORD_HASH_WORKERS', str(max(1, cpu_count // workers)))
+if worker_class == 'gthread':
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+    os.environ.setdefault('DB_MAX_OVERFLOW', str(threads))
+
+# Приложение загружается один раз в мастере и наследуется воркерами (copy-on-write).
+# Импорт приложения не открывает соединений с БД (движок создается лениво), а
+# все, что процесс создает для себя (пулы, потоки, очереди), пересоздается в post_fork
+preload_app = True
+
+# Воркер перезапускается после max_requests (+ случайный разброс, чтобы не все сразу):
+# ограничивает рост памяти процесса
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+# Время на завершение текущих запросов при перезапуске / деплое
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+accesslog = None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+# Мастер, до запуска воркеров: то, что можно посчитать один раз и отдать всем через fork
+def when_ready(server):
+    from auth import passwords
+    passwords.warm_up(start_pool=False)
+
+
+def post_fork(server, worker):
+    import imagekit_utils
+    import logging_config
+    from auth import passwords
+    from course import cleanup, ordering
+    from models import dispose_engine
+
+    # Соединения, если мастер успел их открыть, дочернему процессу не принадлежат
+    dispose_engine()
+    # Поток записи логов в дочернем процессе не работает - запускаем свой
+    logging_config.restart_listener()
+    passwords.reset_after_fork()
+    imagekit_utils.reset_after_fork()
+    ordering.reset_after_fork()
+    cleanup.reset_after_fork()
+
+
+# Воркер, до приема запросов: соединение с БД и процессы хэширования паролей.
+# Ошибка прогрева не мешает воркеру стартовать - первый запрос сделает то же самое сам.
+# Кэши пользователей и доступов (auth/auth.py, course/access.py) не заполняются заранее:
+# записи по пользователю, промах стоит одного запроса по ключу, а живут они недолго
+# (PRINCIPAL_CACHE_TTL / ENTITLEMENT_CACHE_TTL) - заранее загруженное устарело бы до первого запроса
+def post_worker_init(worker):
+    from sqlalchemy import text
+    from auth import passwords
+    from models import get_engine
+
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text('SELECT 1'))
+        passwords.warm_up()
+    except Exception:
+        logging.getLogger('gunicorn.error').exception('Worker warm-up failed')
+
+
+def worker_exit(server, worker):
+    import logging_config
+    logging_config.stop_logging()
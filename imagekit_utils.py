@@ -1,39 +1,216 @@
-from imagekitio import ImageKit
-from config import Config
 import base64
+import http.client
+import json
+import logging
+import mimetypes
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from sqlalchemy import select, insert, update, delete
+from config import Config
+from models import get_engine, UploadJob
+
+CHUNK_SIZE = 256 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class ImageKitUploadError(Exception):
+    pass
+
+
+# Ошибки, после которых имеет смысл повторить запрос (сеть, 429, 5xx)
+class RetryableUploadError(ImageKitUploadError):
+    pass
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# Ограничивает число загрузок в очереди + в работе, чтобы не копить временные файлы
+_slots = threading.BoundedSemaphore(Config.IMAGEKIT_UPLOAD_QUEUE_SIZE)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.IMAGEKIT_UPLOAD_WORKERS,
+                    thread_name_prefix='imagekit-upload'
+                )
+    return _executor
+
+
+# Потоки загрузки не переживают fork - в дочернем процессе пул создается заново
+def reset_after_fork():
+    global _executor, _executor_lock, _slots
+    _executor = None
+    _executor_lock = threading.Lock()
+    _slots = threading.BoundedSemaphore(Config.IMAGEKIT_UPLOAD_QUEUE_SIZE)
+
+
+def _multipart_envelope(boundary, fields, file_name):
+    head = []
+    for name, value in fields.items():
+        head.append(
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f'{value}\r\n'
+        )
+    content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    file_name = file_name.replace('"', '%22').replace('\r', '').replace('\n', '')
+    head.append(
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    )
+    tail = f'\r\n--{boundary}--\r\n'
+    return ''.join(head).encode('utf-8'), tail.encode('utf-8')
+
+
+# multipart/form-data POST, тело файла отправляется кусками прямо с диска
+def _post_multipart(path, file_name, fields):
+    url = urlsplit(Config.IMAGEKIT_UPLOAD_URL)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    boundary = uuid.uuid4().hex
+    head, tail = _multipart_envelope(boundary, fields, file_name)
+    credentials = base64.b64encode(f'{Config.IMAGEKIT_PRIVATE_KEY or ""}:'.encode('utf-8')).decode('ascii')
+
+    conn = connection_class(url.hostname, url.port, timeout=Config.IMAGEKIT_TIMEOUT)
+    try:
+        conn.putrequest('POST', url.path or '/')
+        conn.putheader('Authorization', f'Basic {credentials}')
+        conn.putheader('Content-Type', f'multipart/form-data; boundary={boundary}')
+        conn.putheader('Content-Length', str(len(head) + os.path.getsize(path) + len(tail)))
+        conn.endheaders()
+        conn.send(head)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                conn.send(chunk)
+        conn.send(tail)
+        response = conn.getresponse()
+        body = response.read()
+    except (OSError, http.client.HTTPException) as e:
+        raise RetryableUploadError(f'ImageKit upload failed: {str(e)}')
+    finally:
+        conn.close()
+
+    if response.status == 429 or response.status >= 500:
+        raise RetryableUploadError(f'ImageKit upload failed: HTTP {response.status}')
+    if response.status >= 300:
+        raise ImageKitUploadError(f'ImageKit upload failed: HTTP {response.status} {body[:200]!r}')
+    return json.loads(body)
+
+
+def _upload(path, file_name, folder_path):
+    fields = {
+        'fileName': file_name,
+        'folder': folder_path,
+        'isPrivateFile': 'false',
+        'useUniqueFileName': 'true'
+    }
+    try:
+        for attempt in range(Config.IMAGEKIT_MAX_RETRIES + 1):
+            try:
+                upload = _post_multipart(path, file_name, fields)
+                return {
+                    'url': upload.get('url', ''),
+                    'file_id': upload.get('fileId', ''),
+                    'thumbnail_url': upload.get('thumbnailUrl', '')
+                }
+            except RetryableUploadError:
+                if attempt == Config.IMAGEKIT_MAX_RETRIES:
+                    raise
+                # Экспоненциальная задержка с джиттером
+                time.sleep(Config.IMAGEKIT_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+    finally:
+        os.remove(path)
+        _slots.release()
+
+
+# Ставит загрузку в фоновую очередь и возвращает Future с результатом upload_image.
+# Файл запроса сразу копируется во временный файл: после ответа он будет закрыт
+def submit_upload(file, folder_path):
+    if not _slots.acquire(blocking=False):
+        raise ImageKitUploadError('ImageKit upload failed: upload queue is full')
+    path = None
+    try:
+        fd, path = tempfile.mkstemp(prefix='imagekit-')
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, CHUNK_SIZE)
+        return _get_executor().submit(_upload, path, file.filename, folder_path)
+    except Exception:
+        if path and os.path.exists(path):
+            os.remove(path)
+        _slots.release()
+        raise
 
-imagekit = ImageKit(
-    public_key=Config.IMAGEKIT_PUBLIC_KEY,
-    private_key=Config.IMAGEKIT_PRIVATE_KEY,
-    url_endpoint=Config.IMAGEKIT_URL_ENDPOINT
-)
 
 def upload_image(file, folder_path):
+    return submit_upload(file, folder_path).result()
+
+
+# Статус задачи - в таблице upload_jobs: запрос статуса может прийти в другой воркер,
+# а воркер, начавший загрузку, - перезапуститься
+def _finish_job(job_id, future):
+    if future.exception() is not None:
+        values = {'status': 'failed', 'error': str(future.exception())[:1000]}
+    else:
+        values = {'status': 'done', **future.result()}
     try:
-        # Читаем файл и кодируем в base64
-        file_content = file.read()
-        encoded_file = base64.b64encode(file_content).decode('utf-8')
-        
-        # Получаем оригинальное имя файла
-        filename = file.filename
-        
-        # Загружаем в ImageKit
-        upload = imagekit.upload(
-            file=encoded_file,
-            file_name=filename,
-            options={
-                "folder": folder_path,
-                "is_private_file": False,
-                "use_unique_file_name": True
-            }
-        )
-        
-        return {
-            'url': upload.get('url', ''),
-            'file_id': upload.get('file_id', ''),
-            'thumbnail_url': upload.get('thumbnail_url', '')
-        }
-        
-    except Exception as e:
-        print(f"ImageKit upload error: {str(e)}")  # Для отладки
-        raise Exception(f"ImageKit upload failed: {str(e)}")
\ No newline at end of file
+        with get_engine().begin() as conn:
+            conn.execute(
+                update(UploadJob).where(UploadJob.id == job_id)
+                .values(finished_at=datetime.utcnow(), **values)
+            )
+    except Exception:
+        logger.exception('Failed to record ImageKit upload job %s', job_id)
+
+
+def start_upload_job(file, folder_path):
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    with get_engine().begin() as conn:
+        # Заодно удаляем задачи старше TTL
+        conn.execute(delete(UploadJob).where(
+            UploadJob.created_at < now - timedelta(seconds=Config.IMAGEKIT_JOB_TTL)
+        ))
+        conn.execute(insert(UploadJob).values(id=job_id, status='pending', created_at=now))
+    try:
+        future = submit_upload(file, folder_path)
+    except Exception:
+        with get_engine().begin() as conn:
+            conn.execute(delete(UploadJob).where(UploadJob.id == job_id))
+        raise
+    future.add_done_callback(lambda done: _finish_job(job_id, done))
+    return job_id
+
+
+def get_upload_job(job_id):
+    with get_engine().connect() as conn:
+        job = conn.execute(select(UploadJob).where(UploadJob.id == job_id)).first()
+    if job is None:
+        return None
+    if job.status == 'pending':
+        # Воркер с этой загрузкой завершился, не записав результат
+        if job.created_at < datetime.utcnow() - timedelta(seconds=Config.IMAGEKIT_JOB_TTL):
+            return {'status': 'failed', 'error': 'ImageKit upload was interrupted'}
+        return {'status': 'pending'}
+    if job.status == 'failed':
+        return {'status': 'failed', 'error': job.error}
+    return {'status': 'done', 'result': {
+        'url': job.url,
+        'file_id': job.file_id,
+        'thumbnail_url': job.thumbnail_url
+    }}
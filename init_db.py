@@ -0,0 +1,7 @@
+# Создает таблицы и применяет изменения схемы (колонки, индексы).
+# Запускается при деплое перед стартом gunicorn: python init_db.py
+from models import init_db, get_engine
+
+if __name__ == "__main__":
+    init_db()
+    print(f"Database schema is up to date ({get_engine().url.render_as_string(hide_password=True)})")
@@ -0,0 +1,159 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_app_context, request
+from config import Config
+
+# Атрибуты LogRecord, которые не являются пользовательскими полями из extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+# Одна JSON-строка на запись: время, уровень, логгер, сообщение, request_id и поля из extra=
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+# Выполняется в потоке, который пишет лог: добавляет id текущего запроса
+# и прореживает DEBUG-записи (LOG_DEBUG_SAMPLE_RATE)
+class RequestContextFilter(logging.Filter):
+    def __init__(self, debug_sample_rate=1.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1.0 \
+                and random.random() >= self.debug_sample_rate:
+            return False
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_app_context() else None
+        return True
+
+
+# QueueHandler с ограниченной очередью: при переполнении запись отбрасывается,
+# а не блокирует запрос
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Сообщение и traceback собираются здесь, чтобы в очередь не попадали
+        # аргументы и кадры стека, которые могут измениться или удерживать память
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _build_output_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if Config.LOG_FORMAT == 'json' else TextFormatter())
+    return handler
+
+
+# Настраивает корневой логгер: запись в очередь в потоке запроса,
+# форматирование и вывод - в отдельном потоке QueueListener. Повторный вызов ничего не делает
+def setup_logging():
+    global _listener, _handler
+    with _lock:
+        if _handler is not None:
+            return
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+        _handler.addFilter(RequestContextFilter(Config.LOG_DEBUG_SAMPLE_RATE))
+
+        root = logging.getLogger()
+        root.handlers = [_handler]
+        root.setLevel(Config.LOG_LEVEL)
+
+        _listener = QueueListener(_handler.queue, _build_output_handler(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+# Поток QueueListener не переживает fork - в дочернем процессе его нужно запустить заново.
+# Очередь тоже новая: блокировки старой могли быть захвачены потоком родителя в момент fork
+def restart_listener():
+    global _listener
+    with _lock:
+        if _handler is None:
+            return
+        _handler.queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        _listener = QueueListener(_handler.queue, _build_output_handler(), respect_handler_level=True)
+        _listener.start()
+
+
+def stop_logging():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logging_stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0
+    }
+
+
+def init_app(app):
+    setup_logging()
+
+    @app.before_request
+    def assign_request_id():
+        # Id приходит от прокси (X-Request-ID) или создается здесь
+        g.request_id = request.headers.get('X-Request-ID', '')[:128] or uuid.uuid4().hex
+
+    @app.after_request
+    def add_request_id_header(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
@@ -0,0 +1,194 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+# Границы корзин гистограмм (секунды)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label values -> [счетчики по корзинам (+Inf последней), сумма, количество]
+        self._series = {}
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            return [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def collect(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+request_duration = Histogram()
+request_db_time = Histogram()
+requests_total = Counter()
+db_queries_total = Counter()
+serialize_seconds_total = Counter()
+in_flight = Counter()
+
+
+# Время SQL-запросов. Слушатель на классе Engine: движок создается лениво (models.get_engine)
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Отметка хранится в контексте выполнения: при ошибке запроса она просто исчезает вместе с ним
+    context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None and has_app_context():
+        g.db_time = g.get('db_time', 0.0) + time.perf_counter() - started
+        g.db_queries = g.get('db_queries', 0) + 1
+
+
+# Вызывается из fast_json: время кодирования ответа текущего запроса
+def add_serialize_time(seconds):
+    if has_app_context():
+        g.serialize_time = g.get('serialize_time', 0.0) + seconds
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _render_histogram(lines, name, help_text, histogram, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, counts, total, count in histogram.collect():
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % bound
+            lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(label_names, labels)} {total}')
+        lines.append(f'{name}_count{_labels(label_names, labels)} {count}')
+
+
+def _render_values(lines, name, help_text, kind, samples, label_names=()):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{name}{_labels(label_names, labels)} {value}')
+
+
+def render_metrics():
+    from models import get_pool_stats
+    from auth import principal_cache
+    from course.access import entitlement_cache
+    from logging_config import get_logging_stats
+
+    lines = []
+    _render_histogram(lines, 'http_request_duration_seconds', 'Request latency by endpoint.',
+                      request_duration, ('endpoint', 'method'))
+    _render_values(lines, 'http_requests_total', 'Requests by endpoint and status.', 'counter',
+                   requests_total.collect(), ('endpoint', 'method', 'status'))
+    _render_values(lines, 'http_requests_in_flight', 'Requests being processed.', 'gauge',
+                   in_flight.collect(), ('endpoint',))
+    _render_histogram(lines, 'http_request_db_seconds', 'Time spent in SQL per request.',
+                      request_db_time, ('endpoint', 'method'))
+    _render_values(lines, 'db_queries_total', 'SQL statements executed by endpoint.', 'counter',
+                   db_queries_total.collect(), ('endpoint',))
+    _render_values(lines, 'json_serialize_seconds_total', 'Time spent encoding JSON responses.', 'counter',
+                   serialize_seconds_total.collect(), ('endpoint',))
+
+    pool = get_pool_stats()
+    _render_values(lines, 'db_pool_checkouts_total', 'Connections checked out of the pool.', 'counter',
+                   [((), pool['checkouts'])])
+    _render_values(lines, 'db_pool_timeouts_total', 'Pool checkouts that timed out.', 'counter',
+                   [((), pool['timeouts'])])
+    _render_values(lines, 'db_pool_wait_seconds_total', 'Time spent waiting for a pooled connection.', 'counter',
+                   [((), pool['wait_total_ms'] / 1000)])
+    for key in ('size', 'checked_out', 'overflow'):
+        if key in pool:
+            _render_values(lines, f'db_pool_{key}', f'Connection pool {key.replace("_", " ")}.', 'gauge',
+                           [((), pool[key])])
+
+    caches = [(('principal',), principal_cache.stats()), (('entitlement',), entitlement_cache.stats())]
+    for key, kind in (('hits', 'counter'), ('misses', 'counter'), ('size', 'gauge')):
+        name = f'cache_{key}_total' if kind == 'counter' else f'cache_{key}'
+        _render_values(lines, name, f'In-process cache {key}.', kind,
+                       [(labels, stats[key]) for labels, stats in caches], ('cache',))
+
+    log_stats = get_logging_stats()
+    _render_values(lines, 'log_records_dropped_total', 'Log records dropped on a full queue.', 'counter',
+                   [((), log_stats['dropped'])])
+    _render_values(lines, 'log_queue_depth', 'Log records waiting to be written.', 'gauge',
+                   [((), log_stats['queued'])])
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        in_flight.inc((_endpoint(),))
+
+    @app.after_request
+    def record_status(response):
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(exception=None):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        endpoint = _endpoint()
+        method = request.method
+        in_flight.inc((endpoint,), -1)
+        request_duration.observe((endpoint, method), time.perf_counter() - started)
+        request_db_time.observe((endpoint, method), g.get('db_time', 0.0))
+        requests_total.inc((endpoint, method, str(g.get('response_status', 500))))
+        if g.get('db_queries'):
+            db_queries_total.inc((endpoint,), g.db_queries)
+        if g.get('serialize_time'):
+            serialize_seconds_total.inc((endpoint,), g.serialize_time)
+
+    # Метрики процесса (при нескольких воркерах gunicorn - каждого воркера отдельно)
+    @app.route('/metrics')
+    def metrics():
+        if Config.METRICS_TOKEN:
+            token = request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+            if not hmac.compare_digest(token, Config.METRICS_TOKEN):
+                return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -1,5 +1,24 @@
-from .models import Base, Course, CourseAccess, Video , User, Comment, PdfDocument #noqa
-from .models import engine, SessionLocal  # Импорт движка и сессии #noqa
+from flask import g, has_app_context
+from sqlalchemy.orm import scoped_session
+import threading
 
-# Создаем сессию для работы с БД
-session = SessionLocal()
\ No newline at end of file
+from .models import Base, Course, CourseAccess, Video , User, Comment, PdfDocument, StoredFile, FileCleanupTask, UploadJob #noqa
+from .models import get_engine, dispose_engine, init_db, SessionLocal, get_pool_stats, dialect_insert  # Импорт движка и сессии #noqa
+
+
+def _session_scope():
+    # Внутри Flask - одна сессия на контекст приложения (т.е. на запрос),
+    # вне Flask (скрипты) - одна сессия на поток
+    if has_app_context():
+        return id(g._get_current_object())
+    return threading.get_ident()
+
+
+# Сессия, привязанная к запросу. Закрывается в teardown (см. init_app)
+session = scoped_session(SessionLocal, scopefunc=_session_scope)
+
+
+def init_app(app):
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        session.remove()
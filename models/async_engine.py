@@ -0,0 +1,66 @@
+import threading
+from sqlalchemy.engine import make_url
+from config import Config
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:  # asyncio-расширение SQLAlchemy нужно только для asgi.py
+    create_async_engine = None
+
+# Синхронный драйвер -> асинхронный для того же диалекта
+ASYNC_DRIVERS = {
+    'postgresql': 'asyncpg',
+    'sqlite': 'aiosqlite',
+}
+
+_async_engine = None
+_async_engine_lock = threading.Lock()
+
+
+def async_database_url(url=None):
+    if url is None and Config.ASYNC_DATABASE_URL:
+        return make_url(Config.ASYNC_DATABASE_URL)
+    url = make_url(url or Config.SQLALCHEMY_DATABASE_URI)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for {backend}; set ASYNC_DATABASE_URL')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def build_async_engine(url=None):
+    if create_async_engine is None:
+        raise ImportError('sqlalchemy.ext.asyncio is not available (greenlet is required)')
+    url = async_database_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return create_async_engine(url)
+    connect_args = {}
+    if url.get_driver_name() == 'asyncpg' and 'sslmode' in url.query:
+        # asyncpg не понимает ?sslmode= из строки libpq - передаем его как ssl
+        connect_args['ssl'] = url.query['sslmode']
+        url = url.difference_update_query(['sslmode'])
+    return create_async_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING
+    )
+
+
+# Как get_engine(): создается при первом обращении, в своем процессе
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                _async_engine = build_async_engine()
+    return _async_engine
+
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
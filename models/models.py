@@ -1,20 +1,138 @@
+import os
+import threading
+import time
 from datetime import datetime
 
-from sqlalchemy import create_engine, Column, String, DateTime, ForeignKey, Enum as DbEnum, LargeBinary, Integer, text  # noqa
+from sqlalchemy import create_engine, inspect, select, Column, String, DateTime, ForeignKey, Enum as DbEnum, LargeBinary, Integer, BigInteger, Index, text  # noqa
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql import func #noqa
 from config import Config
 from werkzeug.security import generate_password_hash, check_password_hash
 
-# Create engine and Base for standalone use
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+# Счетчики ожидания при получении соединения из пула
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_total_ms': round(self.wait_total * 1000, 3),
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'wait_avg_ms': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0
+            }
+
+
+pool_stats = PoolStats()
+
+
+# QueuePool, который измеряет время ожидания свободного соединения
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - start)
+        return conn
+
+
+def build_engine(url=None):
+    url = make_url(url or Config.SQLALCHEMY_DATABASE_URI)
+    if url.get_backend_name() == 'sqlite':
+        # SQLite используется только локально (скрипты, бенчмарки) - пул не настраиваем
+        return create_engine(url)
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING
+    )
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+# Движок создается при первом обращении к БД, а не при импорте
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = build_engine()
+    return _engine
+
+
+# Закрывает соединения пула (например, в дочернем процессе после fork)
+def dispose_engine():
+    if _engine is not None:
+        _engine.dispose()
+
+
+def get_pool_stats():
+    pool = get_engine().pool
+    stats = pool_stats.snapshot()
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow()
+        })
+    return stats
+
+
+# sessionmaker, который привязывает сессию к движку в момент ее создания
+class LazySessionMaker(sessionmaker):
+    def __call__(self, **local_kw):
+        if local_kw.get('bind') is None and self.kw.get('bind') is None:
+            local_kw['bind'] = get_engine()
+        return super().__call__(**local_kw)
+
+
 Base = declarative_base()
 # Session factory for standalone scripts (outside of Flask)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = LazySessionMaker(autocommit=False, autoflush=False)
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Фильтр по роли + keyset-пагинация по id в админском списке
+        Index('ix_users_role_id', 'role', 'id'),
+        # Поиск по префиксу (LIKE 'abc%') в Postgres требует *_pattern_ops
+        Index('ix_users_email_prefix', 'email', postgresql_ops={'email': 'varchar_pattern_ops'}),
+        Index('ix_users_first_name_prefix', 'first_name', postgresql_ops={'first_name': 'varchar_pattern_ops'}),
+    )
     
     id = Column(Integer, primary_key=True)
     email = Column(String(120), unique=True, nullable=False)
@@ -25,7 +143,9 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(
+            password, method=Config.PASSWORD_HASH_METHOD, salt_length=Config.PASSWORD_SALT_LENGTH
+        )
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -39,9 +159,15 @@ class Course(Base):
     thumbnail_url = Column(String(500))  # URL or path to course thumbnail image
     created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Увеличивается при любом изменении курса, его видео или PDF (используется для ETag)
+    content_version = Column(Integer, nullable=False, default=1, server_default=text('1'))
 
 class Video(Base):
     __tablename__ = 'videos'
+    __table_args__ = (
+        # Список видео курса: WHERE course_id = ? ORDER BY "order"
+        Index('ix_videos_course_order', 'course_id', 'order'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(200), nullable=False)
@@ -55,6 +181,10 @@ class Video(Base):
 
 class PdfDocument(Base):
     __tablename__ = 'pdf_documents'
+    __table_args__ = (
+        # Список PDF курса: WHERE course_id = ? ORDER BY "order"
+        Index('ix_pdf_documents_course_order', 'course_id', 'order'),
+    )
     
     id = Column(Integer, primary_key=True)
     title = Column(String(200), nullable=False)
@@ -65,6 +195,12 @@ class PdfDocument(Base):
 
 class CourseAccess(Base):
     __tablename__ = 'course_access'
+    __table_args__ = (
+        # Одна запись доступа на пару (user_id, course_id) - используется в ON CONFLICT
+        Index('uq_course_access_user_course', 'user_id', 'course_id', unique=True),
+        # Доступы курса (удаление курса, выдача по course_id)
+        Index('ix_course_access_course', 'course_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id', name='fk_student_user'), nullable=False)
@@ -75,6 +211,9 @@ class CourseAccess(Base):
 
 class Comment(Base):
     __tablename__ = 'comments'
+    __table_args__ = (
+        Index('ix_comments_video_created', 'video_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     text = Column(String(1000), nullable=False)
@@ -82,8 +221,133 @@ class Comment(Base):
     video_id = Column(Integer, ForeignKey('videos.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# Загруженный файл в content-addressed хранилище (см. course/storage.py).
+# Ключ - (sha256, расширение): одинаковые байты с разными расширениями - разные объекты.
+# ref_count - сколько записей (курсов, видео, PDF) ссылаются на эти байты
+class StoredFile(Base):
+    __tablename__ = 'stored_files'
+
+    sha256 = Column(String(64), primary_key=True)
+    ext = Column(String(16), primary_key=True, default='', server_default='')
+    path = Column(String(500), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Очередь удаления файлов: строки добавляются в той же транзакции, что и удаление
+# записей, и обрабатываются фоновым потоком (см. course/cleanup.py)
+class FileCleanupTask(Base):
+    __tablename__ = 'file_cleanup_queue'
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String(500), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Фоновая загрузка в ImageKit (см. imagekit_utils.py). Состояние хранится в БД, а не в памяти
+# процесса: статус виден любому воркеру и переживает его перезапуск
+class UploadJob(Base):
+    __tablename__ = 'upload_jobs'
+    __table_args__ = (
+        # Удаление старых задач
+        Index('ix_upload_jobs_created', 'created_at'),
+    )
+
+    id = Column(String(32), primary_key=True)
+    status = Column(String(16), nullable=False, default='pending')
+    url = Column(String(1000))
+    file_id = Column(String(100))
+    thumbnail_url = Column(String(1000))
+    error = Column(String(1000))
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
 # Пересоздаем enum тип
 
-# Создание таблиц (перемещено в конец файла)
-Base.metadata.create_all(bind=engine)
+
+# INSERT с поддержкой ON CONFLICT для используемых диалектов
+def dialect_insert(table, bind):
+    if bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif bind.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'ON CONFLICT is not supported for {bind.dialect.name}')
+    return insert(table)
+
+def ensure_columns(bind):
+    # create_all не добавляет новые колонки в уже существующие таблицы.
+    # Поддерживаются только колонки, допускающие NULL или имеющие server_default
+    inspector = inspect(bind)
+    quote = bind.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=bind.dialect)}'
+            if column.server_default is not None:
+                ddl += f' DEFAULT {column.server_default.arg.text}'
+            if not column.nullable:
+                ddl += ' NOT NULL'
+            with bind.begin() as conn:
+                conn.execute(text(ddl))
+
+
+def dedupe_course_access(bind):
+    # До появления уникального индекса grant-access мог создать несколько записей на одну пару.
+    # Оставляем запись с самой поздней end_date
+    inspector = inspect(bind)
+    if not inspector.has_table('course_access'):
+        return
+    if any(index['name'] == 'uq_course_access_user_course' for index in inspector.get_indexes('course_access')):
+        return
+    with bind.begin() as conn:
+        conn.execute(text("""
+            DELETE FROM course_access WHERE id IN (
+                SELECT a.id FROM course_access a
+                JOIN course_access b ON a.user_id = b.user_id AND a.course_id = b.course_id
+                WHERE a.end_date < b.end_date OR (a.end_date = b.end_date AND a.id < b.id)
+            )
+        """))
+        # Заменен уникальным uq_course_access_user_course
+        conn.execute(text("DROP INDEX IF EXISTS ix_course_access_user_course"))
+
+
+def upgrade_stored_files(bind):
+    # Первая версия stored_files была с ключом только по sha256. Пересоздаем таблицу
+    # с ключом (sha256, ext), расширение берем из пути объекта
+    inspector = inspect(bind)
+    if not inspector.has_table('stored_files'):
+        return
+    if 'ext' in {column['name'] for column in inspector.get_columns('stored_files')}:
+        return
+    table = StoredFile.__table__
+    with bind.begin() as conn:
+        columns = [table.c.sha256, table.c.path, table.c.size, table.c.ref_count, table.c.created_at]
+        rows = [dict(row) for row in conn.execute(select(*columns)).mappings()]
+        conn.execute(text('DROP TABLE stored_files'))
+        table.create(bind=conn)
+        for row in rows:
+            row['ext'] = os.path.splitext(row['path'])[1]
+        if rows:
+            conn.execute(table.insert(), rows)
+
+
+def ensure_indexes(bind):
+    # create_all не добавляет индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+# Создание и обновление схемы. Вызывается при деплое (init_db.py), а не при импорте
+def init_db(bind=None):
+    bind = bind or get_engine()
+    upgrade_stored_files(bind)
+    Base.metadata.create_all(bind=bind)
+    ensure_columns(bind)
+    dedupe_course_access(bind)
+    ensure_indexes(bind)
 
@@ -0,0 +1,52 @@
+import base64
+import json
+from flask import request
+from config import Config
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# Курсор - непрозрачная для клиента строка с ключом последней записи страницы
+def encode_cursor(*values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+# Читает ?cursor=&limit= из запроса. Возвращает (значения курсора или None, limit)
+def get_page_args(default_limit, cursor_size=1):
+    return parse_page_args(request.args, default_limit, cursor_size)
+
+
+# То же для любого словаря параметров (query_params в ASGI-маршрутах)
+def parse_page_args(args, default_limit, cursor_size=1):
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor, cursor_size) if cursor else None
+
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise PaginationError('Invalid limit')
+    if limit < 1:
+        raise PaginationError('Invalid limit')
+    return after, min(limit, Config.MAX_PAGE_SIZE)
+
+
+# Отрезает лишнюю (limit + 1) запись и строит курсор следующей страницы
+def split_page(rows, limit, cursor_key):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(*cursor_key(rows[-1]))
+    return rows, None
@@ -0,0 +1,101 @@
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Списки параметров IN (?, ?, ?) разной длины - один и тот же запрос
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+# Активные счетчики текущего потока / задачи (вложенные count_queries считают все)
+_trackers = ContextVar('query_trackers', default=())
+
+
+def statement_shape(statement):
+    return _IN_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class QueryTracker:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def record(self, statement):
+        self.statements.append(statement)
+
+    # Запросы одной формы, выполненные threshold и более раз - кандидаты в N+1
+    def repeated(self, threshold=None):
+        threshold = threshold or Config.N_PLUS_ONE_THRESHOLD
+        shapes = Counter(statement_shape(statement) for statement in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for tracker in _trackers.get():
+        tracker.record(statement)
+
+
+@contextmanager
+def count_queries():
+    tracker = QueryTracker()
+    token = _trackers.set(_trackers.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _trackers.reset(token)
+
+
+# Для тестов: with assert_max_queries(3): client.get(...)
+@contextmanager
+def assert_max_queries(max_count):
+    with count_queries() as tracker:
+        yield tracker
+    if tracker.count > max_count:
+        statements = '\n'.join(f'  {statement_shape(statement)}' for statement in tracker.statements)
+        raise AssertionError(f'Expected at most {max_count} queries, got {tracker.count}:\n{statements}')
+
+
+# Для тестов: число запросов одного вызова маршрута, например
+# assert_endpoint_queries(client, 'get', '/api/courses', 2, headers=headers)
+def assert_endpoint_queries(client, method, path, max_count, **kwargs):
+    with assert_max_queries(max_count):
+        return getattr(client, method.lower())(path, **kwargs)
+
+
+# Подсчет по запросам включается QUERY_COUNTER=true (разработка, стенды): заголовок
+# X-Query-Count и предупреждения в лог о повторяющихся запросах
+def init_app(app):
+    if not Config.QUERY_COUNTER:
+        return
+
+    @app.before_request
+    def start_query_tracking():
+        g.query_tracker = QueryTracker()
+        g.query_tracker_token = _trackers.set(_trackers.get() + (g.query_tracker,))
+
+    @app.after_request
+    def report_queries(response):
+        tracker = g.get('query_tracker')
+        if tracker is not None:
+            response.headers['X-Query-Count'] = str(tracker.count)
+            for shape, count in tracker.repeated():
+                logger.warning('Possible N+1: statement executed %d times', count,
+                               extra={'statement': shape, 'endpoint': request.endpoint})
+        return response
+
+    @app.teardown_request
+    def stop_query_tracking(exception=None):
+        token = g.pop('query_tracker_token', None)
+        if token is not None:
+            _trackers.reset(token)
@@ -0,0 +1,75 @@
+# Тесты не трогают DATABASE_URL разработчика: база берется из TEST_DATABASE_URL,
+# по умолчанию - временная SQLite. Переменная ставится до импорта config
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'tests.db')
+
+
+import jwt  # noqa: E402
+import pytest  # noqa: E402
+from datetime import datetime, timedelta  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    import models
+    from app import app as flask_app
+    models.init_db()
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    from auth.auth import principal_cache
+    from course.access import entitlement_cache
+    # Каждый тест начинает с пустых кэшей: число запросов не зависит от порядка тестов
+    principal_cache.clear()
+    entitlement_cache.clear()
+    return app.test_client()
+
+
+def _get_or_create_user(email, role):
+    from models import session, User
+    user = session.query(User).filter_by(email=email).first()
+    if user is None:
+        user = User(email=email, first_name=role.title(), last_name='Test', role=role, password_hash='-')
+        session.add(user)
+        session.commit()
+    user_id = user.id
+    session.remove()
+    return user_id
+
+
+def auth_headers(user_id):
+    from config import Config
+    token = jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                       Config.SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture(scope='session')
+def admin_headers(app):
+    return auth_headers(_get_or_create_user('test-admin@example.com', 'admin'))
+
+
+# Студент с действующим доступом к одному курсу: (заголовки, course_id)
+@pytest.fixture(scope='session')
+def student(app):
+    from models import session, Course, CourseAccess
+    user_id = _get_or_create_user('test-student@example.com', 'student')
+    admin_id = _get_or_create_user('test-admin@example.com', 'admin')
+    course = Course(title='Test course', description='Test', thumbnail_url='', created_by=admin_id)
+    session.add(course)
+    session.flush()
+    session.add(CourseAccess(user_id=user_id, course_id=course.id,
+                             end_date=datetime.utcnow() + timedelta(days=30)))
+    session.commit()
+    course_id = course.id
+    session.remove()
+    return auth_headers(user_id), course_id
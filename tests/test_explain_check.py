@@ -0,0 +1,21 @@
+# benchmarks/explain_check.py как тест: планы запросов горячих маршрутов на сидированной базе
+import pytest
+from sqlalchemy.exc import OperationalError
+
+
+@pytest.fixture(scope='module')
+def results():
+    from models import get_engine
+    try:
+        with get_engine().connect():
+            pass
+    except (OperationalError, ImportError) as e:
+        pytest.skip(f'Database is not available: {e}')
+
+    from benchmarks.explain_check import run_checks
+    return run_checks()
+
+
+def test_no_seq_scans_on_hot_routes(results):
+    failed = {f'{name} ({path})': problems for name, path, statements, problems in results if problems}
+    assert not failed
@@ -0,0 +1,30 @@
+# Бюджеты SQL-запросов горячих маршрутов (query_counter.py). Холодные кэши - худший случай
+from query_counter import assert_endpoint_queries, assert_max_queries
+
+
+def test_courses_admin(client, admin_headers):
+    # Пользователь, отпечаток списка для ETag, страница курсов
+    response = assert_endpoint_queries(client, 'get', '/api/courses', 3, headers=admin_headers)
+    assert response.status_code == 200
+
+
+def test_courses_student(client, student):
+    headers, course_id = student
+    # Пользователь, доступы, отпечаток курсов с доступом, страница курсов
+    response = assert_endpoint_queries(client, 'get', '/api/courses', 4, headers=headers)
+    assert response.status_code == 200
+    assert course_id in [course['id'] for course in response.get_json()['courses']]
+
+
+def test_cached_principal_costs_no_query(client, admin_headers):
+    client.get('/api/courses', headers=admin_headers)
+    # Повторный запрос: пользователь берется из principal_cache
+    with assert_max_queries(2):
+        response = client.get('/api/courses', headers=admin_headers)
+    assert response.status_code == 200
+
+
+def test_course_bundle(client, student):
+    headers, course_id = student
+    response = assert_endpoint_queries(client, 'get', f'/api/course/{course_id}/bundle', 3, headers=headers)
+    assert response.status_code == 200